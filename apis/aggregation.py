@@ -0,0 +1,152 @@
+from decimal import Context, Decimal
+import numpy as np
+from . import history_store
+
+MAX_HISTORY_DAYS = 3650
+# Upper bound on points returned for any window; charts can't show more.
+MAX_POINTS = 1000
+RESOLUTIONS = ("day", "week", "month")
+# HistoricalPrice.price is Decimal(30, 10); float rounding can add a digit
+_PLACES = Decimal("1e-10")
+_CONTEXT = Context(prec=40)
+
+# 1970-01-01 was a Thursday; shifting by 3 days puts week buckets on Mondays.
+_WEEK_OFFSET = 3
+
+
+def _bucket_keys(days, resolution):
+    """Integer bucket id per point; `days` are int days since the epoch."""
+    if resolution == "day":
+        return days
+    if resolution == "week":
+        return (days + _WEEK_OFFSET) // 7
+    if resolution == "month":
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    raise ValueError(f"Unknown resolution {resolution!r}")
+
+
+def max_candles(days, resolution):
+    """Most candles a window of `days` days (plus today) can span at `resolution`."""
+    if resolution == "day":
+        return days + 1
+    if resolution == "week":
+        return -(-(days + 1) // 7) + 1
+    if resolution == "month":
+        return -(-(days + 1) // 28) + 1
+    raise ValueError(f"Unknown resolution {resolution!r}")
+
+
+def _bucket_start(keys, resolution):
+    if resolution == "day":
+        return keys.astype("datetime64[D]")
+    if resolution == "week":
+        return (keys * 7 - _WEEK_OFFSET).astype("datetime64[D]")
+    return keys.astype("datetime64[M]").astype("datetime64[D]")
+
+
+def _segment_arg(values, starts, seg_ids, reduce):
+    """Index of the first element equal to the per-segment reduce() result."""
+    extreme = reduce.reduceat(values, starts)
+    hits = np.flatnonzero(values == extreme[seg_ids])
+    _, first = np.unique(seg_ids[hits], return_index=True)
+    return hits[first]
+
+
+def ohlc(days, prices, resolution):
+    """
+    Aggregate a sorted daily series into OHLC candles.
+
+    Args:
+        days: int64 array of days since the epoch, ascending
+        prices: float64 array of the same length
+        resolution: one of RESOLUTIONS
+
+    Returns:
+        (bucket_start_dates, open_idx, high_idx, low_idx, close_idx) where the
+        *_idx arrays index into the input, so callers emit stored values
+    """
+    if len(days) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return np.empty(0, dtype="datetime64[D]"), empty, empty, empty, empty
+
+    keys = _bucket_keys(days, resolution)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+    seg_ids = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(keys)]))
+
+    high = _segment_arg(prices, starts, seg_ids, np.maximum)
+    low = _segment_arg(prices, starts, seg_ids, np.minimum)
+    return _bucket_start(keys[starts], resolution), starts, high, low, ends
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Returns:
+        ascending int64 indices of the points to keep (at most `threshold`)
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        cx = x[next_start:next_end].mean()
+        cy = y[next_start:next_end].mean()
+
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - cx) * (by - y[a]) - (x[a] - bx) * (cy - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def _fmt(value):
+    """
+    Same text as HistoricalPriceSerializer's DecimalField (10 places). The
+    store holds float64, whose shortest repr is exactly the stored Decimal
+    for prices of up to 15 significant digits; longer ones come back rounded
+    to 15-17 digits.
+    """
+    return format(Decimal(repr(float(value))).quantize(_PLACES, context=_CONTEXT), "f")
+
+
+def history_series(coin_id, start_date, resolution=None, max_points=MAX_POINTS):
+    """
+    History for a coin since `start_date`, bounded in size.
+
+    With a resolution, returns the most recent `max_points` OHLC candles;
+    otherwise {"date", "price"} rows, LTTB-downsampled to `max_points` when the
+    window has more points. Reads the columnar history store, not the ORM.
+    """
+    days, prices = history_store.series(coin_id, start_date=start_date)
+    if len(days) == 0:
+        return []
+    dates = days.astype("datetime64[D]").astype(str).tolist()
+
+    if resolution:
+        starts, o, h, l, c = ohlc(days, prices, resolution)
+        starts, o, h, l, c = (a[-max_points:] for a in (starts, o, h, l, c))
+        return [
+            {
+                "date": str(start),
+                "open": _fmt(prices[oi]),
+                "high": _fmt(prices[hi]),
+                "low": _fmt(prices[li]),
+                "close": _fmt(prices[ci]),
+            }
+            for start, oi, hi, li, ci in zip(starts, o, h, l, c)
+        ]
+
+    keep = lttb(days.astype(np.float64), prices, max_points)
+    return [{"date": dates[i], "price": _fmt(prices[i])} for i in keep]
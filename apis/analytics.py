@@ -0,0 +1,125 @@
+import math
+import warnings
+from datetime import date
+import numpy as np
+from django.core.cache import cache
+from django.db.models import F
+from .models import Coin
+from . import history_store
+from .metrics import record_cache
+
+ANALYTICS_WINDOWS = (7, 30, 90)
+ANALYTICS_METRICS = ("returns", "volatility", "moving_averages", "correlation")
+# Recomputed after every history refresh; the TTL only covers a missed run.
+ANALYTICS_TTL = 2 * 24 * 60 * 60
+TRADING_DAYS = 365
+# The correlation matrix is quadratic in coins, so it only covers the top
+# CORRELATION_COINS by market cap; the other metrics cover every coin.
+CORRELATION_COINS = 50
+
+
+def _key(days):
+    return f"analytics:{days}"
+
+
+def _clean(value):
+    """Plain float, or None for NaN/inf so the result is valid JSON."""
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def ema(matrix, span):
+    """
+    Exponential moving average along the time axis, vectorized across coins.
+    Missing days carry the previous average forward.
+    """
+    alpha = 2.0 / (span + 1)
+    out = np.full(matrix.shape, np.nan)
+    current = np.full(matrix.shape[0], np.nan)
+    for j in range(matrix.shape[1]):
+        column = matrix[:, j]
+        seen = ~np.isnan(column)
+        start = seen & np.isnan(current)
+        update = seen & ~start
+        current[start] = column[start]
+        current[update] = alpha * column[update] + (1 - alpha) * current[update]
+        out[:, j] = current
+    return out
+
+
+def compute_window(coins, days, today=None):
+    """
+    All metrics for one window over the given (id, coingecko_id) coins.
+
+    A single aligned price matrix feeds every metric:
+    - returns: last / first price in the window - 1
+    - volatility: std of daily log returns over the window, annualized
+    - moving_averages: latest SMA and EMA over the window
+    - correlation: pairwise correlation of daily log returns between the
+      first CORRELATION_COINS coins (callers pass coins best rank first)
+    """
+    today = today or date.today()
+    ids = [coin[0] for coin in coins]
+    names = [coin[1] for coin in coins]
+    _, matrix = history_store.price_matrix(ids, days, today=today)
+
+    # All-NaN rows (coins without history yet) legitimately produce NaN here.
+    with warnings.catch_warnings(), np.errstate(divide="ignore", invalid="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        first, last, has_any = history_store.first_last_valid(matrix)
+        rets = np.where(has_any, last / first - 1.0, np.nan)
+
+        log_rets = history_store.log_returns(matrix)
+        vol = np.nanstd(log_rets, axis=1, ddof=1) * math.sqrt(TRADING_DAYS)
+
+        sma = np.nanmean(matrix, axis=1)
+        ema_latest = ema(matrix, days)[:, -1]
+
+        if ids:
+            top = log_rets[:CORRELATION_COINS]
+            corr = np.ma.corrcoef(np.ma.masked_invalid(top), allow_masked=True)
+            corr = np.atleast_2d(corr.filled(np.nan))
+        else:
+            corr = []
+
+    return {
+        "days": days,
+        "as_of": today.isoformat(),
+        "returns": [
+            {"coin": name, "return": _clean(r)} for name, r in zip(names, rets)
+        ],
+        "volatility": [
+            {"coin": name, "volatility": _clean(v)} for name, v in zip(names, vol)
+        ],
+        "moving_averages": [
+            {"coin": name, "price": _clean(p), "sma": _clean(s), "ema": _clean(e)}
+            for name, p, s, e in zip(names, last, sma, ema_latest)
+        ],
+        "correlation": {
+            "coins": names[:CORRELATION_COINS],
+            "matrix": [[_clean(v) for v in row] for row in corr],
+        },
+    }
+
+
+def compute_market_analytics(windows=ANALYTICS_WINDOWS):
+    """Compute and cache every window for all tracked coins."""
+    coins = list(
+        Coin.objects
+        .order_by(F("market_cap_rank").asc(nulls_last=True), "id")
+        .values_list("id", "coingecko_id")
+    )
+    results = {days: compute_window(coins, days) for days in windows}
+    cache.set_many({_key(days): result for days, result in results.items()}, ANALYTICS_TTL)
+    return results
+
+
+def get_market_analytics(days):
+    """
+    Cached analytics for a window, or None until compute_market_analytics
+    has run. Never computed inline: with every tracked coin that would take
+    a web worker for as long as the task does.
+    """
+    result = cache.get(_key(days))
+    record_cache("analytics", result is not None)
+    return result
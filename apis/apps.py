@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ApisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apis'
+
+    def ready(self):
+        # Connects the Celery signal handlers in web and worker processes
+        from . import metrics  # noqa: F401
@@ -0,0 +1,152 @@
+"""
+ASGI-native versions of the hot read endpoints.
+
+Plain Django async views rather than DRF APIViews, which run synchronously:
+while one request waits on the cache or the database the event loop serves
+the others, so a single uvicorn worker holds many concurrent connections.
+Responses are rendered with the same renderer as the DRF views so bodies match
+byte for byte. Work with no async API yet (the history store, the QA engine,
+the Redis throttle) runs in a thread via sync_to_async.
+"""
+import json
+import math
+from datetime import date, timedelta
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import ValidationError
+
+from .models import Coin
+from .encoders import coin_encoder
+from .tiers import record_view
+from .renderers import ORJSONRenderer
+from .qa import handle_query
+from .authentication import aauthenticate
+from .cache import HISTORY_WINDOWS, acached_history, acached_qa_response, atop_coins_for_user
+from .throttling import QAThrottle
+from .aggregation import MAX_POINTS, history_series
+from .pagination import next_link, parse_listing_params
+from .tasks import revalidate_stale
+from .views import conditional_json_response, parse_history_params, with_data_age
+
+
+def _json(data, status=200, **headers):
+    response = HttpResponse(ORJSONRenderer().render(data), content_type="application/json", status=status)
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+_record_view = sync_to_async(record_view, thread_sensitive=False)
+_revalidate_stale = sync_to_async(revalidate_stale, thread_sensitive=False)
+
+
+async def _stale_while_revalidate(response, updated):
+    """Async views.stale_while_revalidate."""
+    await _revalidate_stale(updated)
+    return with_data_age(response, updated)
+
+
+def _not_authenticated():
+    return _json(
+        {"detail": "Authentication credentials were not provided."},
+        status=401,
+        **{"WWW-Authenticate": 'Bearer realm="api"'},
+    )
+
+
+class AsyncTopCoinsView(View):
+    """
+    GET /api/async/coins/top/?n=10&cursor=<next>&fields=id,name
+    Async TopCoinsView: same response, served from the async cache client.
+    """
+
+    async def get(self, request):
+        user = await aauthenticate(request)
+        if user is None:
+            return _not_authenticated()
+
+        try:
+            n, after, fields = parse_listing_params(request.GET)
+        except ValidationError as e:
+            return _json(e.detail, status=400)
+        rows, next_after, updated = await atop_coins_for_user(n, user.id, after=after, fields=fields)
+
+        link = next_link(request.build_absolute_uri(), next_after)
+        return await _stale_while_revalidate(_json(rows, **({"Link": link} if link else {})), updated)
+
+
+class AsyncCoinHistoryView(View):
+    """
+    GET /api/async/coins/<coingecko_id>/history/?days=30&resolution=week&max_points=200
+    Async CoinHistoryView. Standard windows come from the pre-rendered cache
+    with ETag/Last-Modified; other windows read the columnar history store.
+    """
+
+    async def get(self, request, coingecko_id):
+        user = await aauthenticate(request)
+        if user is None:
+            return _not_authenticated()
+
+        try:
+            days, resolution, max_points = parse_history_params(request.GET)
+        except ValidationError as e:
+            return _json(e.detail, status=400)
+
+        if days in HISTORY_WINDOWS and resolution is None and max_points is None:
+            cached = await acached_history(coingecko_id, days)
+            if cached is None:
+                return _json({"detail": "Not found."}, status=404)
+            await _record_view(coingecko_id)
+            body, etag, last_modified, updated = cached
+            return await _stale_while_revalidate(
+                conditional_json_response(request, body, etag, last_modified), [updated]
+            )
+
+        encode = coin_encoder()
+        coin = await Coin.objects.filter(coingecko_id=coingecko_id).values(*encode.columns).afirst()
+        if coin is None:
+            return _json({"detail": "No Coin matches the given query."}, status=404)
+        await _record_view(coingecko_id)
+
+        start_date = date.today() - timedelta(days=days)
+        data = {"coin": encode(coin)}
+        if resolution:
+            data["resolution"] = resolution
+        data["history"] = await sync_to_async(history_series)(
+            coin["id"], start_date, resolution=resolution, max_points=max_points or MAX_POINTS
+        )
+        updated = (coingecko_id, coin["updated_at"].timestamp(), coin["market_cap_rank"])
+        return await _stale_while_revalidate(_json(data), [updated])
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncQAView(View):
+    """
+    POST /api/async/qa/
+    Async QAView: same per-IP throttle and per-query answer cache.
+    """
+
+    async def post(self, request):
+        throttle = QAThrottle()
+        if not await sync_to_async(throttle.allow_request)(request, self):
+            wait = math.ceil(throttle.wait())
+            return _json(
+                {"detail": f"Request was throttled. Expected available in {wait} seconds."},
+                status=429,
+                **{"Retry-After": str(wait)},
+            )
+
+        try:
+            query = json.loads(request.body or b"{}").get("query")
+        except (ValueError, AttributeError):
+            return _json({"detail": "JSON parse error."}, status=400)
+        if not query:
+            return _json({"error": "Missing 'query' in request body"}, status=400)
+
+        result = await acached_qa_response(query, handle_query)
+        if result.get("coin"):
+            await _record_view(result["coin"])
+        return _json(result)
@@ -0,0 +1,26 @@
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+
+async def aauthenticate(request, allow_query_token=False):
+    """
+    Resolve the JWT user for a plain (non-DRF) async view.
+
+    Reads the Authorization header, or ?token= when `allow_query_token` is set
+    (EventSource can't send headers). Returns None if missing or invalid,
+    including a malformed header and a deleted, inactive or revoked user.
+    """
+    auth = JWTAuthentication()
+    try:
+        raw = request.GET.get("token") if allow_query_token else None
+        if raw is None:
+            header = auth.get_header(request)
+            raw = auth.get_raw_token(header) if header else None
+        if raw is None:
+            return None
+        token = auth.get_validated_token(raw)
+        return await sync_to_async(auth.get_user)(token)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
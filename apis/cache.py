@@ -0,0 +1,468 @@
+import time
+import hashlib
+from bisect import bisect_left
+from asgiref.sync import sync_to_async
+from datetime import date, timedelta
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Coin, FavoriteCoin, HistoricalPrice
+from .encoders import coin_encoder, favorite_encoder, history_encoder
+from .renderers import ORJSONRenderer
+from .metrics import record_cache
+
+MARKET_VERSION_KEY = "market:version"
+# Hot coins refresh every minute; the TTL only bounds memory if a
+# version is never read again.
+TOP_COINS_TTL = 10 * 60
+FAVORITES_TTL = 60 * 60
+# Per-coin rows behind favorites and watchlists; favorited coins are rewritten
+# on every market tick, the TTL drops the ones nobody favorites any more.
+COIN_ROW_TTL = 60 * 60
+SPARKLINE_DAYS = 7
+# History changes at most once a day; windows the frontend charts request.
+HISTORY_WINDOWS = (7, 30, 90, 365)
+HISTORY_TTL = 24 * 60 * 60
+# QA answers are built from market data, so they live as long as one refresh
+QA_TTL = 5 * 60
+
+
+def market_version():
+    """
+    Current market data version. Bumped by fetch_top_coins after each commit,
+    so every key built from it is invalidated at once.
+    """
+    version = cache.get(MARKET_VERSION_KEY)
+    if version is None:
+        cache.add(MARKET_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(MARKET_VERSION_KEY)
+    return version
+
+
+async def amarket_version():
+    """market_version() through the async cache API."""
+    version = await cache.aget(MARKET_VERSION_KEY)
+    if version is None:
+        await cache.aadd(MARKET_VERSION_KEY, time.time_ns(), timeout=None)
+        version = await cache.aget(MARKET_VERSION_KEY)
+    return version
+
+
+def bump_market_version():
+    cache.set(MARKET_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def _top_coins_key(version, n):
+    return f"topcoins:{version}:{n}"
+
+
+def _favorites_key(user_id):
+    return f"userfavorites:{user_id}"
+
+
+def _coin_row_key(coin_id):
+    return f"coinrow:{coin_id}"
+
+
+def _sparkline_key(coin_id, today):
+    return f"sparkline:{coin_id}:{today.isoformat()}"
+
+
+def _top_coins_queryset(n, after=None, fields=None):
+    """
+    One keyset page on (market_cap_rank, id), unranked coins last. Fetches one
+    extra row so the caller knows whether a next page exists.
+    """
+    coins = Coin.objects.order_by(F("market_cap_rank").asc(nulls_last=True), "id")
+    if after is not None:
+        rank, pk = after
+        if rank is None:
+            coins = coins.filter(market_cap_rank__isnull=True, id__gt=pk)
+        else:
+            coins = coins.filter(
+                Q(market_cap_rank__gt=rank)
+                | Q(market_cap_rank=rank, id__gt=pk)
+                | Q(market_cap_rank__isnull=True)
+            )
+    columns = {"id", "coingecko_id", "market_cap_rank", "updated_at", *coin_encoder(fields).columns}
+    return coins.values(*columns)[:n + 1]
+
+
+def _coin_page(rows, n, fields=None):
+    """
+    Encode a fetched page of `.values()` rows. `ids`, `next` and `updated`
+    are kept beside the output so the favorite overlay, the cursor and the
+    staleness check work whatever fields were selected.
+    """
+    rows = list(rows)
+    more = len(rows) > n
+    rows = rows[:n]
+    encode = coin_encoder(fields)
+    return {
+        "rows": [encode(row) for row in rows],
+        "ids": [row["id"] for row in rows],
+        "next": [rows[-1]["market_cap_rank"], rows[-1]["id"]] if more else None,
+        "updated": [
+            (row["coingecko_id"], row["updated_at"].timestamp(), row["market_cap_rank"]) for row in rows
+        ],
+    }
+
+
+def build_top_coins(n, after=None, fields=None):
+    """Serialize one user-independent page of the coin listing."""
+    return _coin_page(_top_coins_queryset(n, after, fields), n, fields)
+
+
+def _load_favorites(rows):
+    encode = favorite_encoder()
+    return {row["coin"]: encode(row) for row in rows}
+
+
+def _favorites_queryset(user_id):
+    return FavoriteCoin.objects.filter(user_id=user_id).order_by("id").values(*favorite_encoder().columns)
+
+
+def refresh_favorites(user_id):
+    """Rebuild the user's cached favorites from one single-table query."""
+    favorites = _load_favorites(_favorites_queryset(user_id))
+    cache.set(_favorites_key(user_id), favorites, FAVORITES_TTL)
+    return favorites
+
+
+def user_favorites(user_id):
+    """
+    The user's favorites, cached: coin id -> FavoriteCoinSerializer-shaped
+    {"id", "coin", "created_at"}, oldest first. Doubles as the set of
+    favorited coin ids for `in` checks.
+    """
+    favorites = cache.get(_favorites_key(user_id))
+    record_cache("favorites", favorites is not None)
+    if favorites is None:
+        favorites = refresh_favorites(user_id)
+    return favorites
+
+
+def refresh_coin_rows(coin_ids=None, coingecko_ids=None, favorited_only=False):
+    """
+    Write the cached CoinSerializer rows for the given coins, by id or
+    coingecko_id. With favorited_only, coins nobody has favorited are skipped;
+    that is how each market tick keeps favorites and watchlists current.
+
+    Returns:
+        dict of coin id -> row
+    """
+    encode = coin_encoder()
+    coins = Coin.objects.all()
+    if coin_ids is not None:
+        coins = coins.filter(id__in=coin_ids)
+    if coingecko_ids is not None:
+        coins = coins.filter(coingecko_id__in=coingecko_ids)
+    if favorited_only:
+        coins = coins.filter(id__in=FavoriteCoin.objects.values("coin_id"))
+    rows = {row["id"]: encode(row) for row in coins.values(*encode.columns)}
+    cache.set_many({_coin_row_key(pk): row for pk, row in rows.items()}, COIN_ROW_TTL)
+    return rows
+
+
+def _sparklines(coin_ids, today):
+    """7-day history points per coin for the coins whose sparkline wasn't cached."""
+    encode = history_encoder()
+    points = {pk: [] for pk in coin_ids}
+    rows = (
+        HistoricalPrice.objects
+        .filter(coin_id__in=coin_ids, date__gte=today - timedelta(days=SPARKLINE_DAYS))
+        .order_by("coin_id", "date")
+        .values("coin_id", *encode.columns)
+    )
+    for row in rows:
+        points[row["coin_id"]].append(encode(row))
+    cache.set_many({_sparkline_key(pk, today): series for pk, series in points.items()}, HISTORY_TTL)
+    return points
+
+
+def _favorite_coins(favorites, sparklines=False):
+    """
+    Cached coin rows (and sparklines) for a user's favorites in one cache
+    round trip; misses are filled with one query each.
+    """
+    coin_ids = list(favorites)
+    today = date.today()
+    keys = [_coin_row_key(pk) for pk in coin_ids]
+    if sparklines:
+        keys += [_sparkline_key(pk, today) for pk in coin_ids]
+    hits = cache.get_many(keys)
+
+    rows = {pk: hits[_coin_row_key(pk)] for pk in coin_ids if _coin_row_key(pk) in hits}
+    missing = [pk for pk in coin_ids if pk not in rows]
+    record_cache("coinrow", not missing)
+    if missing:
+        rows.update(refresh_coin_rows(coin_ids=missing))
+    if not sparklines:
+        return rows, {}
+
+    series = {pk: hits[_sparkline_key(pk, today)] for pk in coin_ids if _sparkline_key(pk, today) in hits}
+    missing = [pk for pk in coin_ids if pk not in series]
+    record_cache("sparkline", not missing)
+    if missing:
+        series.update(_sparklines(missing, today))
+    return rows, series
+
+
+def favorites_list(user_id):
+    """FavoriteCoinSerializer output for the user's favorites, without a join."""
+    favorites = user_favorites(user_id)
+    rows, _ = _favorite_coins(favorites)
+    return [
+        {
+            "id": favorite["id"],
+            "coin": pk,
+            "coin_name": rows[pk]["name"],
+            "coin_symbol": rows[pk]["symbol"],
+            "created_at": favorite["created_at"],
+        }
+        for pk, favorite in favorites.items()
+        if pk in rows
+    ]
+
+
+def watchlist(user_id):
+    """
+    The user's favorite coins with their market data, when they were
+    favorited and a SPARKLINE_DAYS price sparkline, oldest favorite first.
+    """
+    favorites = user_favorites(user_id)
+    rows, series = _favorite_coins(favorites, sparklines=True)
+    return [
+        {
+            **rows[pk],
+            "is_favorite": True,
+            "favorited_at": favorite["created_at"],
+            "sparkline": series[pk],
+        }
+        for pk, favorite in favorites.items()
+        if pk in rows
+    ]
+
+
+def _select_fields(page, fields):
+    """A cached all-fields page narrowed to a sparse fieldset."""
+    if fields is None:
+        return page
+    return {**page, "rows": [{name: row[name] for name in fields} for row in page["rows"]]}
+
+
+def _with_favorites(page, favorites):
+    rows = page["rows"]
+    if not rows or "is_favorite" not in rows[0]:
+        return rows
+    return [{**row, "is_favorite": pk in favorites} for row, pk in zip(rows, page["ids"])]
+
+
+def top_coins_for_user(n, user_id, after=None, fields=None):
+    """
+    One page of the coin listing with `is_favorite` overlaid from the user's
+    cached favorite set. The first page is cached with every field, keyed on
+    n alone, and `fields` is applied to the cached rows; later pages are read
+    straight off the (market_cap_rank, id) index. Clients therefore can't
+    grow the cache with arbitrary cursors or field sets. Page and favorites
+    lookups go out in a single cache round trip after the version read.
+
+    Returns:
+        (rows, next, updated) where next is the (market_cap_rank, id) keyset
+        position of the last row, or None on the last page, and updated lists
+        (coingecko_id, updated_at timestamp, market_cap_rank) for the rows served
+    """
+    fav_key = _favorites_key(user_id)
+    if after is None:
+        page_key = _top_coins_key(market_version(), n)
+        hits = cache.get_many([page_key, fav_key])
+        page = hits.get(page_key)
+        record_cache("topcoins", page is not None)
+        if page is None:
+            page = build_top_coins(n)
+            cache.set(page_key, page, TOP_COINS_TTL)
+        page = _select_fields(page, fields)
+    else:
+        hits = cache.get_many([fav_key])
+        page = build_top_coins(n, after, fields)
+
+    favorites = hits.get(fav_key)
+    if favorites is not None:
+        record_cache("favorites", True)
+    else:
+        favorites = user_favorites(user_id)
+
+    return _with_favorites(page, favorites), page["next"], page["updated"]
+
+
+async def atop_coins_for_user(n, user_id, after=None, fields=None):
+    """Async top_coins_for_user using the async cache API and async ORM."""
+    fav_key = _favorites_key(user_id)
+    if after is None:
+        page_key = _top_coins_key(await amarket_version(), n)
+        hits = await cache.aget_many([page_key, fav_key])
+        page = hits.get(page_key)
+        record_cache("topcoins", page is not None)
+        if page is None:
+            page = _coin_page([coin async for coin in _top_coins_queryset(n)], n)
+            await cache.aset(page_key, page, TOP_COINS_TTL)
+        page = _select_fields(page, fields)
+    else:
+        hits = await cache.aget_many([fav_key])
+        page = _coin_page([coin async for coin in _top_coins_queryset(n, after, fields)], n, fields)
+
+    favorites = hits.get(fav_key)
+    record_cache("favorites", favorites is not None)
+    if favorites is None:
+        favorites = _load_favorites([row async for row in _favorites_queryset(user_id)])
+        await cache.aset(fav_key, favorites, FAVORITES_TTL)
+
+    return _with_favorites(page, favorites), page["next"], page["updated"]
+
+
+def _etag(body):
+    return hashlib.blake2b(body, digest_size=8).hexdigest()
+
+
+def _history_key(coingecko_id, days, today):
+    return f"history:{coingecko_id}:{days}:{today.isoformat()}"
+
+
+def _coin_key(version, coingecko_id):
+    return f"coin:{version}:{coingecko_id}"
+
+
+def coin_entry(coingecko_id):
+    """
+    Pre-rendered CoinSerializer-shaped JSON for one coin, cached per market version.
+    Returns None if the coin does not exist.
+    """
+    key = _coin_key(market_version(), coingecko_id)
+    entry = cache.get(key)
+    record_cache("coin", entry is not None)
+    if entry is None:
+        encode = coin_encoder()
+        row = Coin.objects.filter(coingecko_id=coingecko_id).values(*encode.columns).first()
+        if row is None:
+            return None
+        body = ORJSONRenderer().render(encode(row))
+        entry = {
+            "id": row["id"], "json": body, "etag": _etag(body),
+            "modified": row["updated_at"], "rank": row["market_cap_rank"],
+        }
+        cache.set(key, entry, TOP_COINS_TTL)
+    return entry
+
+
+def rebuild_history_series(coin_id, coingecko_id, today=None):
+    """
+    Pre-render the history JSON for every standard window from a single query.
+    Called after history ingest commits, and lazily on a cache miss.
+
+    Returns:
+        dict of window -> cache entry
+    """
+    today = today or date.today()
+    encode = history_encoder()
+    rows = list(
+        HistoricalPrice.objects
+        .filter(coin_id=coin_id, date__gte=today - timedelta(days=max(HISTORY_WINDOWS)))
+        .order_by("date")
+        .values(*encode.columns)
+    )
+    dates = [row["date"] for row in rows]
+    encoded = [encode(row) for row in rows]
+    now = timezone.now()
+    entries = {}
+    for days in HISTORY_WINDOWS:
+        window = encoded[bisect_left(dates, today - timedelta(days=days)):]
+        body = ORJSONRenderer().render(window)
+        entries[_history_key(coingecko_id, days, today)] = {
+            "json": body,
+            "etag": _etag(body),
+            "modified": now,
+        }
+    # The watchlist sparkline is the same series over SPARKLINE_DAYS
+    sparkline = encoded[bisect_left(dates, today - timedelta(days=SPARKLINE_DAYS)):]
+    cache.set_many({**entries, _sparkline_key(coin_id, today): sparkline}, HISTORY_TTL)
+    return {days: entries[_history_key(coingecko_id, days, today)] for days in HISTORY_WINDOWS}
+
+
+def cached_history(coingecko_id, days):
+    """
+    Full CoinHistoryView body for a standard window, assembled from the
+    pre-rendered coin and series fragments without touching the ORM when warm.
+
+    Returns:
+        (body, etag, last_modified, updated) or None if the coin does not
+        exist; updated is the coin's (coingecko_id, updated_at timestamp,
+        market_cap_rank)
+    """
+    coin = coin_entry(coingecko_id)
+    if coin is None:
+        return None
+
+    series = cache.get(_history_key(coingecko_id, days, date.today()))
+    record_cache("history", series is not None)
+    if series is None:
+        series = rebuild_history_series(coin["id"], coingecko_id)[days]
+    return _assemble_history(coingecko_id, coin, series)
+
+
+async def acached_history(coingecko_id, days):
+    """
+    Async cached_history. A warm hit is one async cache round trip after the
+    version read; misses fall back to the sync builder in a thread.
+    """
+    coin_key = _coin_key(await amarket_version(), coingecko_id)
+    series_key = _history_key(coingecko_id, days, date.today())
+    hits = await cache.aget_many([coin_key, series_key])
+    if coin_key not in hits or series_key not in hits:
+        # cached_history records the per-fragment hits and misses
+        return await sync_to_async(cached_history)(coingecko_id, days)
+    record_cache("coin", True)
+    record_cache("history", True)
+    return _assemble_history(coingecko_id, hits[coin_key], hits[series_key])
+
+
+def _assemble_history(coingecko_id, coin, series):
+    body = b'{"coin":' + coin["json"] + b',"history":' + series["json"] + b"}"
+    etag = f'"{coin["etag"]}-{series["etag"]}"'
+    updated = (coingecko_id, coin["modified"].timestamp(), coin["rank"])
+    return body, etag, max(coin["modified"], series["modified"]), updated
+
+
+def normalize_query(text):
+    return " ".join(text.lower().split())
+
+
+def cached_qa_response(text, handler):
+    """
+    Answer a QA query from cache, keyed on the normalized query text, the
+    market version and the day (trend answers depend on the date window).
+    """
+    normalized = normalize_query(text)
+    key = _qa_key(market_version(), normalized)
+    result = cache.get(key)
+    record_cache("qa", result is not None)
+    if result is None:
+        result = handler(normalized)
+        cache.set(key, result, QA_TTL)
+    return result
+
+
+async def acached_qa_response(text, handler):
+    """Async cached_qa_response; the sync handler runs in a thread on a miss."""
+    normalized = normalize_query(text)
+    key = _qa_key(await amarket_version(), normalized)
+    result = await cache.aget(key)
+    record_cache("qa", result is not None)
+    if result is None:
+        result = await sync_to_async(handler)(normalized)
+        await cache.aset(key, result, QA_TTL)
+    return result
+
+
+def _qa_key(version, normalized):
+    digest = hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+    return f"qa:{version}:{date.today().isoformat()}:{digest}"
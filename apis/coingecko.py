@@ -0,0 +1,89 @@
+import os
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from .metrics import record_coingecko
+
+COINGECKO_API_KEY = os.getenv("COINGECKO_APIKEY")
+COINGECKO_BASE_URL = "https://api.coingecko.com/api/v3"
+
+# (connect, read) timeouts per endpoint; history payloads are much larger
+# than the markets page, so they get a longer read timeout.
+ENDPOINT_TIMEOUTS = {
+    "markets": (3.05, 10),
+    "market_chart": (3.05, 20),
+}
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# Every call goes to one host, so a single pool is enough; size it for the
+# threads a worker process may run concurrently.
+POOL_MAXSIZE = int(os.getenv("COINGECKO_POOL_MAXSIZE", 10))
+
+_session = None
+_session_pid = None
+
+
+def _build_session():
+    session = requests.Session()
+    session.headers.update({
+        "accept": "application/json",
+        "accept-encoding": "gzip, deflate",
+    })
+    if COINGECKO_API_KEY:
+        session.headers["x-cg-demo-api-key"] = COINGECKO_API_KEY
+    # Retries are handled by Celery, so the adapter never retries on its own.
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session():
+    """
+    Return this process's keep-alive session.
+    Rebuilt after a fork so prefork workers never share sockets with the parent.
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        _session = _build_session()
+        _session_pid = os.getpid()
+    return _session
+
+
+def get(endpoint, path, params=None):
+    """
+    GET a CoinGecko path through the pooled session with the endpoint's timeout.
+    Latency is recorded per endpoint and status ("error" if no response).
+    """
+    start = time.perf_counter()
+    try:
+        resp = get_session().get(
+            f"{COINGECKO_BASE_URL}{path}",
+            params=params,
+            timeout=ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT),
+        )
+    except requests.RequestException:
+        record_coingecko(endpoint, "error", time.perf_counter() - start)
+        raise
+    record_coingecko(endpoint, resp.status_code, time.perf_counter() - start)
+    return resp
+
+
+def markets(per_page, page=1, ids=None):
+    params = {
+        "vs_currency": "usd",
+        "order": "market_cap_desc",
+        "per_page": per_page,
+        "page": page,
+    }
+    if ids:
+        params["ids"] = ",".join(ids)
+    return get("markets", "/coins/markets", params)
+
+
+def market_chart(coingecko_id, days):
+    return get("market_chart", f"/coins/{coingecko_id}/market_chart", {
+        "vs_currency": "usd",
+        "days": days,
+    })
+
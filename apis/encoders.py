@@ -0,0 +1,110 @@
+"""
+Precompiled row encoders for the hot read paths.
+
+Turns `.values()` rows into exactly what the matching ModelSerializer would
+output, without building model instances or walking serializer fields per
+row. Each field's conversion is chosen once per (model, fields) and reused.
+"""
+import decimal
+from functools import lru_cache
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from .models import Coin, FavoriteCoin, HistoricalPrice
+from .serializers import CoinSerializer, HistoricalPriceSerializer
+
+COIN_FIELDS = tuple(CoinSerializer.Meta.fields)
+HISTORY_FIELDS = tuple(HistoricalPriceSerializer.Meta.fields)
+# FavoriteCoinSerializer's own columns; coin_name/coin_symbol come from the coin
+FAVORITE_FIELDS = ("id", "coin", "created_at")
+
+
+def _decimal(field):
+    # DRF DecimalField: quantize to decimal_places at max_digits precision, then "{:f}"
+    exponent = decimal.Decimal(".1") ** field.decimal_places
+    context = decimal.getcontext().copy()
+    context.prec = field.max_digits
+
+    def encode(value):
+        if value is None:
+            return ""
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return f"{value.quantize(exponent, context=context):f}"
+    return encode
+
+
+def _datetime(value):
+    # DRF DateTimeField: current timezone, ISO 8601 with a "Z" for UTC
+    if value is None:
+        return None
+    if settings.USE_TZ:
+        value = value.astimezone(timezone.get_current_timezone())
+    value = value.isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def _date(value):
+    return None if value is None else value.isoformat()
+
+
+def _field_encoder(field):
+    if isinstance(field, models.DecimalField):
+        return _decimal(field)
+    if isinstance(field, models.DateTimeField):
+        return _datetime
+    if isinstance(field, models.DateField):
+        return _date
+    # Integer, float and char columns come out of the DB as the right type
+    return None
+
+
+@lru_cache(maxsize=None)
+def row_encoder(model, fields, **constants):
+    """
+    Compile an encoder for `fields` of `model`.
+
+    Args:
+        model: model class the rows are selected from
+        fields: tuple of output field names, in output order
+        constants: values for non-model output fields, e.g. is_favorite=False
+
+    Returns:
+        function(row dict) -> dict; its `columns` attribute lists the model
+        fields to pass to `.values()`
+    """
+    plan = []
+    for name in fields:
+        if name in constants:
+            plan.append((name, None, True))
+        else:
+            plan.append((name, _field_encoder(model._meta.get_field(name)), False))
+
+    def encode(row):
+        out = {}
+        for name, convert, constant in plan:
+            if constant:
+                out[name] = constants[name]
+            elif convert is None:
+                out[name] = row[name]
+            else:
+                out[name] = convert(row[name])
+        return out
+
+    encode.columns = tuple(name for name, _, constant in plan if not constant)
+    return encode
+
+
+def coin_encoder(fields=None):
+    """CoinSerializer output for `fields` (default all); is_favorite is left False."""
+    return row_encoder(Coin, fields or COIN_FIELDS, is_favorite=False)
+
+
+def history_encoder():
+    return row_encoder(HistoricalPrice, HISTORY_FIELDS)
+
+
+def favorite_encoder():
+    return row_encoder(FavoriteCoin, FAVORITE_FIELDS)
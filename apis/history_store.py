@@ -0,0 +1,135 @@
+"""
+Read-side columnar copy of HistoricalPrice.
+
+Each coin's history is kept as two contiguous .npy files under
+HISTORY_STORE_DIR: int64 days since the epoch and float64 prices, ascending by
+date. They are rewritten by the history ingest after each commit and loaded
+into memory by readers, so analytics never build model instances or Decimals.
+Loaded arrays are not memory-mapped: a mapping keeps a file descriptor open,
+and two per tracked coin runs into the process's open-file limit.
+"""
+import os
+import tempfile
+from collections import OrderedDict
+from datetime import date, timedelta
+import numpy as np
+from django.conf import settings
+from .models import HistoricalPrice
+
+_EPOCH = date(1970, 1, 1)
+# Loaded series kept per process, least recently used evicted first. Enough
+# for the default TOP_COINS_TRACKED; evicted coins are simply re-read.
+MAX_LOADED_COINS = 1000
+_loaded = OrderedDict()
+
+
+def _paths(coin_id):
+    base = os.path.join(settings.HISTORY_STORE_DIR, str(coin_id))
+    return f"{base}.days.npy", f"{base}.prices.npy"
+
+
+def to_day(d):
+    return (d - _EPOCH).days
+
+
+def from_day(day):
+    return _EPOCH + timedelta(days=int(day))
+
+
+def _atomic_save(path, array):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def write_series(coin_id):
+    """Rebuild a coin's arrays from the database."""
+    rows = (
+        HistoricalPrice.objects
+        .filter(coin_id=coin_id)
+        .order_by("date")
+        .values_list("date", "price")
+    )
+    dates, prices = zip(*rows) if rows else ((), ())
+    days = np.array(dates, dtype="datetime64[D]").astype(np.int64)
+    values = np.fromiter(prices, dtype=np.float64, count=len(prices))
+
+    os.makedirs(settings.HISTORY_STORE_DIR, exist_ok=True)
+    days_path, prices_path = _paths(coin_id)
+    # Prices first: a reader that sees the new days file must also see new prices.
+    _atomic_save(prices_path, values)
+    _atomic_save(days_path, days)
+    _loaded.pop(coin_id, None)
+
+
+def load_series(coin_id):
+    """
+    In-memory (days, prices) for a coin, built from the DB on first use.
+    Reloaded when the ingest task has rewritten the files.
+    """
+    days_path, prices_path = _paths(coin_id)
+    try:
+        mtime = os.stat(days_path).st_mtime_ns
+    except FileNotFoundError:
+        write_series(coin_id)
+        mtime = os.stat(days_path).st_mtime_ns
+
+    cached = _loaded.get(coin_id)
+    if cached is None or cached[0] != mtime:
+        days = np.load(days_path)
+        prices = np.load(prices_path)
+        if len(days) != len(prices):
+            # Caught between the two renames of a rewrite; read from the DB.
+            write_series(coin_id)
+            return load_series(coin_id)
+        cached = (mtime, days, prices)
+        _loaded[coin_id] = cached
+        if len(_loaded) > MAX_LOADED_COINS:
+            _loaded.popitem(last=False)
+    _loaded.move_to_end(coin_id)
+    return cached[1], cached[2]
+
+
+def series(coin_id, start_date=None, end_date=None):
+    """(days, prices) for a coin, sliced to [start_date, end_date]."""
+    days, prices = load_series(coin_id)
+    lo = 0 if start_date is None else np.searchsorted(days, to_day(start_date), "left")
+    hi = len(days) if end_date is None else np.searchsorted(days, to_day(end_date), "right")
+    return days[lo:hi], prices[lo:hi]
+
+
+def price_matrix(coin_ids, days, today=None):
+    """
+    Prices of several coins aligned on a common daily axis.
+
+    Returns:
+        (axis, matrix) where axis is int64 days since the epoch covering the
+        last `days` days inclusive, and matrix[i, j] is coin_ids[i]'s price on
+        axis[j], NaN where no row is stored.
+    """
+    today = today or date.today()
+    start = to_day(today) - days
+    axis = np.arange(start, to_day(today) + 1, dtype=np.int64)
+    matrix = np.full((len(coin_ids), len(axis)), np.nan)
+    for row, coin_id in enumerate(coin_ids):
+        d, p = series(coin_id, start_date=from_day(start), end_date=today)
+        matrix[row, d - start] = p
+    return axis, matrix
+
+
+def first_last_valid(matrix):
+    """Per row: first and last non-NaN value, and whether the row has any."""
+    valid = ~np.isnan(matrix)
+    has_any = valid.any(axis=1)
+    first = valid.argmax(axis=1)
+    last = matrix.shape[1] - 1 - valid[:, ::-1].argmax(axis=1)
+    rows = np.arange(matrix.shape[0])
+    return matrix[rows, first], matrix[rows, last], has_any
+
+
+def log_returns(matrix):
+    """Daily log returns along the time axis; NaN where either day is missing."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.diff(np.log(matrix), axis=1)
+
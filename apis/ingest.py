@@ -0,0 +1,157 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+from .models import Coin, HistoricalPrice
+from .cache import bump_market_version, rebuild_history_series, refresh_coin_rows
+from . import history_store
+from .streams import publish_tick
+
+COIN_UPDATE_FIELDS = [
+    "symbol",
+    "name",
+    "market_cap_rank",
+    "last_price",
+    "volume",
+    "percent_change_24h",
+    "updated_at",
+]
+
+
+def collapse_daily_prices(prices):
+    """
+    Collapse CoinGecko [timestamp_ms, price] points to one price per day.
+    The latest point of each day wins, matching the old per-row overwrite order.
+    """
+    daily = {}
+    for timestamp, price in prices:
+        if price is None:
+            continue
+        daily[datetime.fromtimestamp(timestamp / 1000.0).date()] = price
+    return daily
+
+
+def upsert_history(coin, prices, days=None):
+    """
+    Write a coin's price points as one row per day with a single bulk upsert.
+
+    Args:
+        coin: Coin the points belong to
+        prices: CoinGecko [timestamp_ms, price] points
+        days: Window the points were requested for. When upstream's earliest
+            point is after the window start, the coin is younger than the
+            window and its history_start is recorded there.
+
+    Returns:
+        (inserted, updated) row counts
+    """
+    daily = collapse_daily_prices(prices)
+    if not daily:
+        return 0, 0
+    first = min(daily)
+
+    rows = [
+        HistoricalPrice(coin=coin, date=dt, price=Decimal(str(price)))
+        for dt, price in daily.items()
+    ]
+    with transaction.atomic():
+        existing = HistoricalPrice.objects.filter(coin=coin, date__in=list(daily)).count()
+        HistoricalPrice.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["coin", "date"],
+            update_fields=["price"],
+        )
+        if days is not None and first > date.today() - timedelta(days=days):
+            # Only ever moves earlier: a later, shorter response doesn't undo it
+            Coin.objects.filter(pk=coin.pk).filter(
+                Q(history_start__isnull=True) | Q(history_start__gt=first)
+            ).update(history_start=first)
+        transaction.on_commit(lambda: _after_history_commit(coin))
+    return len(rows) - existing, existing
+
+
+def _after_history_commit(coin):
+    """Refresh the read-side copies of a coin's history once rows are committed."""
+    history_store.write_series(coin.pk)
+    rebuild_history_series(coin.pk, coin.coingecko_id)
+
+
+def coin_from_market(c):
+    """Build an unsaved Coin from one /coins/markets entry."""
+    return Coin(
+        coingecko_id=c["id"],
+        symbol=c["symbol"].upper(),
+        name=c["name"],
+        market_cap_rank=c.get("market_cap_rank"),
+        last_price=Decimal(str(c.get("current_price") or 0)),
+        volume=Decimal(str(c.get("total_volume") or 0)),
+        percent_change_24h=c.get("price_change_percentage_24h"),
+    )
+
+
+def upsert_coins(markets):
+    """
+    Write a /coins/markets payload with a single bulk upsert keyed on coingecko_id.
+
+    Returns:
+        list of coingecko_ids that did not exist before this call
+    """
+    coins = {}
+    for c in markets:
+        coins[c["id"]] = coin_from_market(c)
+    if not coins:
+        return []
+
+    with transaction.atomic():
+        existing = set(
+            Coin.objects.filter(coingecko_id__in=list(coins)).values_list("coingecko_id", flat=True)
+        )
+        Coin.objects.bulk_create(
+            list(coins.values()),
+            update_conflicts=True,
+            unique_fields=["coingecko_id"],
+            update_fields=COIN_UPDATE_FIELDS,
+        )
+        transaction.on_commit(bump_market_version)
+        transaction.on_commit(lambda: publish_tick(coins.values()))
+        transaction.on_commit(lambda: refresh_coin_rows(coingecko_ids=list(coins), favorited_only=True))
+    return [cid for cid in coins if cid not in existing]
+
+
+def plan_history_sync(days, coin_ids=None, today=None):
+    """
+    Decide how many days of history each coin needs, from one grouped query.
+
+    Coins with no stored rows in the window, with holes between their first
+    and last stored day, or whose first stored day is after the window start
+    (the window was widened, or only recent rows were kept) get the full
+    `days` backfill. For a coin younger than the window the start is its
+    recorded history_start, so it isn't backfilled again on every run.
+    Everything else only fetches from its last stored day (re-fetched, as it
+    may be partial) to today.
+
+    Returns:
+        dict of coingecko_id -> days to request from CoinGecko
+    """
+    today = today or date.today()
+    start = today - timedelta(days=days)
+    in_window = Q(history__date__gte=start)
+
+    coins = Coin.objects.all()
+    if coin_ids is not None:
+        coins = coins.filter(coingecko_id__in=coin_ids)
+    stats = coins.annotate(
+        first_date=Min("history__date", filter=in_window),
+        last_date=Max("history__date", filter=in_window),
+        stored=Count("history", filter=in_window),
+    ).values_list("coingecko_id", "history_start", "first_date", "last_date", "stored")
+
+    plan = {}
+    for coingecko_id, history_start, first_date, last_date, stored in stats:
+        expected_first = max(start, history_start) if history_start else start
+        if last_date is None or first_date > expected_first or stored < (last_date - first_date).days + 1:
+            plan[coingecko_id] = days
+        else:
+            plan[coingecko_id] = min(days, (today - last_date).days + 1)
+    return plan
@@ -0,0 +1,66 @@
+"""
+Redis in-flight locks for deduplicating Celery work.
+
+A lock is a key holding its owner's token with a TTL: set with SET NX,
+re-entrant for the same token (so a task's retries keep it), and only
+released or extended by its owner. The TTL frees a lock whose worker died.
+"""
+from .ratelimit import _script, get_redis
+
+# KEYS[1] = lock key; ARGV[1] = owner token, ARGV[2] = ttl (ms)
+ACQUIRE_SCRIPT = """
+local owner = redis.call('GET', KEYS[1])
+if owner == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+if owner then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return 1
+"""
+
+EXTEND_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class InFlightLock:
+    """
+    At most one holder per name at a time.
+
+    Args:
+        name: lock name, e.g. "history:bitcoin"
+        ttl: seconds before an unreleased lock expires
+    """
+
+    def __init__(self, name, ttl):
+        self.key = f"inflight:{name}"
+        self.ttl_ms = int(ttl * 1000)
+
+    def acquire(self, token):
+        """True if `token` now holds the lock (also if it already did)."""
+        return bool(_script(ACQUIRE_SCRIPT)(keys=[self.key], args=[token, self.ttl_ms]))
+
+    def extend(self, token, seconds):
+        """Push the expiry out to `seconds` plus the base TTL, if still held."""
+        ttl_ms = int(seconds * 1000) + self.ttl_ms
+        return bool(_script(EXTEND_SCRIPT)(keys=[self.key], args=[token, ttl_ms]))
+
+    def release(self, token):
+        return bool(_script(RELEASE_SCRIPT)(keys=[self.key], args=[token]))
+
+    def holder(self):
+        owner = get_redis().get(self.key)
+        return owner.decode() if owner is not None else None
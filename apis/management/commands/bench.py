@@ -0,0 +1,433 @@
+"""
+Benchmark harness for ingest, the read endpoints and QA parsing.
+
+    python manage.py bench --coins 10 1000 --days 30 365 --output bench.json
+
+Everything runs against a throwaway test database, a local-memory cache and
+a temporary history store. CoinGecko is replaced by an in-process stub that
+replays recorded payloads (--payloads) or deterministic synthetic ones. The
+shared rate limiter, tick publishing, view counters and follow-up task
+scheduling (including stale-while-revalidate refreshes) are also stubbed
+(extra markets pages run inline), so a run never touches the real Redis,
+broker or upstream quota.
+
+The output is JSON with p50/p99 latency and query counts per scenario, so
+two runs can be diffed.
+"""
+import json
+import os
+import platform
+import re
+import shutil
+import tempfile
+import time
+import zlib
+from contextlib import ExitStack, contextmanager
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+import django
+import numpy as np
+import requests
+from requests.adapters import BaseAdapter
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apis import analytics, history_store, tasks
+from apis.ingest import coin_from_market
+from apis.models import Coin, FavoriteCoin, HistoricalPrice
+from apis.qa import handle_query
+from apis.views import QAView
+
+CHART_RE = re.compile(r"^/coins/(?P<id>[^/]+)/market_chart$")
+# Seeded first so QA queries can use real names
+NAMED_COINS = [("bitcoin", "btc", "Bitcoin"), ("ethereum", "eth", "Ethereum"), ("solana", "sol", "Solana")]
+SEED_BATCH = 5000
+
+
+def synthetic_markets(n, seed=0):
+    """A /coins/markets payload for n coins, ranked 1..n."""
+    rng = np.random.default_rng(seed)
+    prices = np.exp(rng.normal(0, 3, n))
+    markets = []
+    for i in range(n):
+        coingecko_id, symbol, name = NAMED_COINS[i] if i < len(NAMED_COINS) else (f"coin-{i}", f"c{i}", f"Coin {i}")
+        markets.append({
+            "id": coingecko_id,
+            "symbol": symbol,
+            "name": name,
+            "market_cap_rank": i + 1,
+            "current_price": float(prices[i]),
+            "total_volume": float(prices[i] * 1e6),
+            "price_change_percentage_24h": float(rng.normal(0, 3)),
+        })
+    return markets
+
+
+def synthetic_chart(coingecko_id, days, now=None):
+    """
+    A /market_chart payload shaped like CoinGecko's: hourly points up to 90
+    days, daily beyond. Deterministic per coin id.
+    """
+    now = now or datetime.now(dt_timezone.utc)
+    step = timedelta(hours=1) if days <= 90 else timedelta(days=1)
+    count = int(timedelta(days=days) / step) + 1
+    rng = np.random.default_rng(zlib.crc32(coingecko_id.encode()))
+    walk = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, count)))
+    start = now - step * (count - 1)
+    return {"prices": [[int((start + step * i).timestamp() * 1000), float(p)] for i, p in enumerate(walk)]}
+
+
+class StubCoinGeckoAdapter(BaseAdapter):
+    """Serves the CoinGecko paths we call from in-memory payloads."""
+
+    def __init__(self, markets, charts):
+        super().__init__()
+        self.markets = markets
+        self.charts = charts
+        self.calls = 0
+
+    def send(self, request, **kwargs):
+        self.calls += 1
+        url = urlsplit(request.url)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = url.path.split("/api/v3", 1)[-1]
+
+        response = requests.Response()
+        response.status_code = 200
+        if path == "/coins/markets":
+            per_page, page = int(params["per_page"]), int(params.get("page", 1))
+            markets = self.markets
+            if "ids" in params:
+                ids = set(params["ids"].split(","))
+                markets = [m for m in markets if m["id"] in ids]
+            body = markets[(page - 1) * per_page:page * per_page]
+        elif match := CHART_RE.match(path):
+            body = self.charts(match["id"], int(params["days"]))
+        else:
+            response.status_code = 404
+            body = {"error": "not found"}
+        response._content = json.dumps(body).encode()
+        response.headers["Content-Type"] = "application/json"
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class _NoLimit:
+    """Stands in for the shared Redis token bucket."""
+
+    def reserve(self):
+        return 0
+
+    def try_acquire(self):
+        return 0
+
+    def cooldown_remaining(self):
+        return 0
+
+    def penalize(self, seconds):
+        return 0
+
+
+class _NoLock:
+    """Stands in for the per-coin Redis in-flight lock."""
+
+    def acquire(self, token):
+        return True
+
+    def extend(self, token, seconds):
+        return True
+
+    def release(self, token):
+        return True
+
+
+def measure(fn, iterations, before=None):
+    """
+    Time `fn` over `iterations` runs, counting queries per run.
+    `before` runs untimed ahead of each call (e.g. to clear the cache).
+    """
+    times, queries = [], []
+    for _ in range(iterations):
+        if before:
+            before()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - start) * 1000)
+        queries.append(len(ctx.captured_queries))
+    p50, p99 = np.percentile(times, [50, 99])
+    return {
+        "iterations": iterations,
+        "p50_ms": round(float(p50), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(np.mean(times)), 3),
+        "queries": int(np.median(queries)),
+        "max_queries": max(queries),
+    }
+
+
+class Command(BaseCommand):
+    help = "Benchmark ingest, read endpoints and QA parsing on synthetic data in a throwaway database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--coins", nargs="+", type=int, default=[10, 100, 1000],
+                            help="Coin counts to seed, one run each (default: 10 100 1000)")
+        parser.add_argument("--days", nargs="+", type=int, default=[30, 365],
+                            help="Days of history per coin, one run each (default: 30 365)")
+        parser.add_argument("--iterations", type=int, default=50,
+                            help="Timed calls per scenario (default: 50)")
+        parser.add_argument("--payloads",
+                            help="Directory with recorded markets.json and market_chart/<id>.json; "
+                                 "synthetic payloads are used for anything missing")
+        parser.add_argument("--seed", type=int, default=0, help="Seed for synthetic data")
+        parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        store_dir = tempfile.mkdtemp(prefix="bench-history-")
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with self._isolated(store_dir):
+                runs = [
+                    self._run(coins, days, options)
+                    for coins in options["coins"]
+                    for days in options["days"]
+                ]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(store_dir, ignore_errors=True)
+
+        report = {
+            "meta": {
+                "created": datetime.now(dt_timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "iterations": options["iterations"],
+                "payloads": "recorded" if options["payloads"] else "synthetic",
+            },
+            "runs": runs,
+        }
+        body = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(body + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(body)
+
+    @contextmanager
+    def _isolated(self, store_dir):
+        with ExitStack() as stack:
+            stack.enter_context(override_settings(
+                CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "bench"}},
+                HISTORY_STORE_DIR=store_dir,
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            ))
+            stack.enter_context(mock.patch.object(tasks, "coingecko_limiter", _NoLimit()))
+            stack.enter_context(mock.patch.object(tasks, "_history_lock", lambda coingecko_id: _NoLock()))
+            stack.enter_context(mock.patch("apis.ingest.publish_tick"))
+            stack.enter_context(mock.patch("apis.views.record_view"))
+            stack.enter_context(mock.patch("apis.async_views._record_view", new_callable=mock.AsyncMock))
+            stack.enter_context(mock.patch("apis.views.revalidate_stale"))
+            stack.enter_context(mock.patch("apis.async_views._revalidate_stale", new_callable=mock.AsyncMock))
+            stack.enter_context(mock.patch.object(tasks.fetch_coins_by_ids, "apply_async"))
+            stack.enter_context(mock.patch.object(tasks.fetch_all_coins_history, "delay"))
+            # Extra markets pages run inline so fetch_top_coins times the whole refresh
+            stack.enter_context(mock.patch.object(
+                tasks.fetch_markets_page, "apply_async",
+                side_effect=lambda args=(), kwargs=None, **options: tasks.fetch_markets_page.apply(args, kwargs),
+            ))
+            stack.enter_context(mock.patch.object(QAView, "throttle_classes", []))
+            yield
+
+    def _load_payloads(self, directory, coins, seed):
+        markets = synthetic_markets(coins, seed=seed)
+        if not directory:
+            return markets, synthetic_chart
+        path = os.path.join(directory, "markets.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                markets = json.load(f)
+
+        def charts(coingecko_id, days):
+            recorded = os.path.join(directory, "market_chart", f"{coingecko_id}.json")
+            if os.path.exists(recorded):
+                with open(recorded) as f:
+                    return json.load(f)
+            return synthetic_chart(coingecko_id, days)
+        return markets, charts
+
+    def _reset(self):
+        call_command("flush", interactive=False, verbosity=0)
+        cache.clear()
+        history_store._loaded.clear()
+        for name in os.listdir(settings.HISTORY_STORE_DIR):
+            os.remove(os.path.join(settings.HISTORY_STORE_DIR, name))
+
+    def _seed(self, markets, days):
+        """Bulk-load coins and one price per day, then build the history store."""
+        rng = np.random.default_rng(len(markets) * 100003 + days)
+        today = date.today()
+        Coin.objects.bulk_create(
+            [coin_from_market(c) for c in markets],
+            batch_size=SEED_BATCH,
+        )
+        coin_ids = list(Coin.objects.order_by("id").values_list("id", flat=True))
+
+        batch = []
+        for coin_id in coin_ids:
+            walk = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, days)))
+            for offset, price in enumerate(walk):
+                batch.append(HistoricalPrice(
+                    coin_id=coin_id,
+                    date=today - timedelta(days=days - 1 - offset),
+                    price=Decimal(f"{price:.10f}"),
+                ))
+            if len(batch) >= SEED_BATCH:
+                HistoricalPrice.objects.bulk_create(batch)
+                batch = []
+        HistoricalPrice.objects.bulk_create(batch)
+        for coin_id in coin_ids:
+            history_store.write_series(coin_id)
+
+    def _run(self, coins, days, options):
+        iterations = options["iterations"]
+        self.stderr.write(f"Benchmarking {coins} coins x {days} days...")
+        self._reset()
+        markets, charts = self._load_payloads(options["payloads"], coins, options["seed"])
+
+        start = time.perf_counter()
+        self._seed(markets, days)
+        seed_seconds = time.perf_counter() - start
+
+        adapter = StubCoinGeckoAdapter(markets, charts)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        results = {}
+        with mock.patch("apis.coingecko.get_session", return_value=session):
+            results["ingest.fetch_top_coins"] = measure(
+                lambda: tasks.fetch_top_coins.apply(kwargs={"n": len(markets)}).get(), iterations
+            )
+            sample = markets[len(markets) // 2]["id"]
+            results["ingest.fetch_coin_history"] = measure(
+                lambda: tasks.fetch_coin_history.apply((sample,), {"days": days}).get(), iterations
+            )
+        results.update(self._endpoints(markets, days, iterations))
+        results.update(self._qa(markets, iterations))
+
+        return {
+            "coins": coins,
+            "days": days,
+            "history_rows": HistoricalPrice.objects.count(),
+            "seed_seconds": round(seed_seconds, 3),
+            "upstream_calls": adapter.calls,
+            "results": results,
+        }
+
+    def _endpoints(self, markets, days, iterations):
+        user = User.objects.create_user("bench", password="bench-password")
+        FavoriteCoin.objects.bulk_create(
+            [FavoriteCoin(user=user, coin=coin) for coin in Coin.objects.order_by("market_cap_rank")[:10]]
+        )
+        authorization = f"Bearer {AccessToken.for_user(user)}"
+        client = Client(HTTP_AUTHORIZATION=authorization)
+        async_client = AsyncClient()
+        coin = markets[0]["id"]
+        few = ",".join(c["id"] for c in markets[:3])
+
+        def get(url):
+            def call():
+                response = client.get(url)
+                if response.status_code != 200:
+                    raise CommandError(f"GET {url} returned {response.status_code}")
+                if response.streaming:
+                    b"".join(response.streaming_content)
+            return call
+
+        def aget(url):
+            def call():
+                response = async_to_sync(async_client.get)(url, headers={"Authorization": authorization})
+                if response.status_code != 200:
+                    raise CommandError(f"GET {url} returned {response.status_code}")
+            return call
+
+        def post(url, data):
+            def call():
+                response = client.post(url, data, content_type="application/json")
+                if response.status_code != 200:
+                    raise CommandError(f"POST {url} returned {response.status_code}")
+            return call
+
+        history = reverse("coin-history", args=[coin])
+        async_history = reverse("async-coin-history", args=[coin])
+        scenarios = {
+            "top_coins?n=10": get(f"{reverse('top-coins')}?n=10"),
+            "top_coins?n=250": get(f"{reverse('top-coins')}?n=250"),
+            "top_coins?n=250&fields": get(f"{reverse('top-coins')}?n=250&fields=id,name,last_price"),
+            "coin_history?days=30": get(f"{history}?days=30"),
+            "coin_history?days=365": get(f"{history}?days=365"),
+            f"coin_history?days={days}&resolution=week": get(f"{history}?days={days}&resolution=week"),
+            f"coin_history?days={days}&max_points=200": get(f"{history}?days={days}&max_points=200"),
+            "analytics/returns?days=30": get(f"{reverse('analytics-returns')}?days=30"),
+            "history_export?coins=3": get(f"{reverse('history-export')}?coins={few}"),
+            "qa": post(reverse("qa"), {"query": f"price of {markets[0]['name']}"}),
+            "favorites": get(reverse("favorite-coin-list-create")),
+            "watchlist": get(reverse("watchlist")),
+            "async/top_coins?n=10": aget(f"{reverse('async-top-coins')}?n=10"),
+            "async/top_coins?n=250": aget(f"{reverse('async-top-coins')}?n=250"),
+            "async/coin_history?days=30": aget(f"{async_history}?days=30"),
+            "async/coin_history?days=365": aget(f"{async_history}?days=365"),
+        }
+        # Analytics are only ever served precomputed; "cold" there means every
+        # other cache is empty
+        def clear_keeping_analytics():
+            cache.clear()
+            analytics.compute_market_analytics()
+
+        results = {
+            "task.compute_market_analytics": measure(analytics.compute_market_analytics, iterations),
+        }
+        for name, call in scenarios.items():
+            before = clear_keeping_analytics if name.startswith("analytics/") else cache.clear
+            results[f"endpoint.{name}"] = {
+                "cold": measure(call, iterations, before=before),
+                "warm": measure(call, iterations),
+            }
+        return results
+
+    def _qa(self, markets, iterations):
+        first, last = markets[0], markets[-1]
+        queries = {
+            "price": f"price of {first['name']}",
+            "price_symbol": f"how much is {first['symbol']} worth?",
+            "trend": f"7 day trend of {first['name']}",
+            "trend_long_tail": f"last 30 days of {last['name']}",
+            "unknown": "what is the meaning of life",
+        }
+        results = {}
+        for name, text in queries.items():
+            results[f"qa.handle_query.{name}"] = {
+                "cold": measure(lambda: handle_query(text), iterations, before=cache.clear),
+                "warm": measure(lambda: handle_query(text), iterations),
+            }
+        return results
@@ -0,0 +1,191 @@
+"""
+Prometheus metrics for HTTP requests, Celery tasks and CoinGecko calls.
+
+With several uvicorn workers, or Celery prefork, set
+PROMETHEUS_MULTIPROC_DIR to an empty directory shared by all processes on the
+host (before they start); each process writes its samples there and /metrics
+aggregates them. Without it, /metrics serves the current process only.
+"""
+import hmac
+import os
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery import signals
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to produce a response", ["method", "endpoint"],
+)
+REQUESTS = Counter(
+    "http_requests_total", "Responses by status code", ["method", "endpoint", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "DB queries per request", ["endpoint"],
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100, 250),
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_duration_seconds", "Time spent in DB queries per request", ["endpoint"],
+)
+RENDER_TIME = Histogram(
+    "http_response_render_seconds", "JSON rendering time per request (pre-rendered responses skip it)",
+    ["endpoint"], buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+CACHE_LOOKUPS = Counter(
+    "app_cache_lookups_total", "Application cache lookups; hit ratio = hit / (hit + miss)", ["cache", "result"],
+)
+TASK_DURATION = Histogram(
+    "celery_task_duration_seconds", "Celery task run time", ["task", "state"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+TASK_RETRIES = Counter("celery_task_retries_total", "Celery task retries", ["task"])
+TASK_FAILURES = Counter("celery_task_failures_total", "Celery tasks that raised", ["task"])
+COINGECKO_LATENCY = Histogram(
+    "coingecko_request_duration_seconds", "CoinGecko call latency", ["endpoint", "status"],
+)
+COINGECKO_THROTTLED = Counter(
+    "coingecko_throttled_total", "CoinGecko 429 responses", ["endpoint"],
+)
+
+_request_stats = ContextVar("request_stats", default=None)
+
+
+class _RequestStats:
+    __slots__ = ("queries", "db_seconds", "render_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = None
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - start
+
+
+def record_render(seconds):
+    """Add response rendering time to the current request, if any."""
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.render_seconds = (stats.render_seconds or 0.0) + seconds
+
+
+def record_cache(name, hit):
+    CACHE_LOOKUPS.labels(name, "hit" if hit else "miss").inc()
+
+
+def record_coingecko(endpoint, status, seconds):
+    COINGECKO_LATENCY.labels(endpoint, str(status)).observe(seconds)
+    if status == 429:
+        COINGECKO_THROTTLED.labels(endpoint).inc()
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status, DB query count/time and render time per URL name.
+    DB stats are only collected for sync requests: async views reach the DB
+    through sync_to_async threads with their own connections.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = _RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats.execute))
+                response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        self._observe(request, response, stats, time.perf_counter() - start, db=True)
+        return response
+
+    async def __acall__(self, request):
+        stats = _RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        self._observe(request, response, stats, time.perf_counter() - start, db=False)
+        return response
+
+    @staticmethod
+    def _observe(request, response, stats, seconds, db):
+        match = getattr(request, "resolver_match", None)
+        endpoint = (match and match.url_name) or "unmatched"
+        REQUEST_LATENCY.labels(request.method, endpoint).observe(seconds)
+        REQUESTS.labels(request.method, endpoint, str(response.status_code)).inc()
+        if db:
+            REQUEST_QUERIES.labels(endpoint).observe(stats.queries)
+            REQUEST_DB_TIME.labels(endpoint).observe(stats.db_seconds)
+        if stats.render_seconds is not None:
+            RENDER_TIME.labels(endpoint).observe(stats.render_seconds)
+
+
+_task_started = {}
+
+
+@signals.task_prerun.connect
+def _task_prerun(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@signals.task_postrun.connect
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    start = _task_started.pop(task_id, None)
+    if start is not None and task is not None:
+        TASK_DURATION.labels(task.name, state or "UNKNOWN").observe(time.perf_counter() - start)
+
+
+@signals.task_retry.connect
+def _task_retry(sender=None, **kwargs):
+    TASK_RETRIES.labels(getattr(sender, "name", "unknown")).inc()
+
+
+@signals.task_failure.connect
+def _task_failure(sender=None, **kwargs):
+    TASK_FAILURES.labels(getattr(sender, "name", "unknown")).inc()
+
+
+def metrics_view(request):
+    """
+    GET /metrics
+    Prometheus exposition of every metric above. The scraper must send
+    METRICS_TOKEN as `Authorization: Bearer <token>`; without a configured
+    token the endpoint is not served at all (404).
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        return HttpResponse(status=404)
+    header = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(header.encode(), f"Bearer {token}".encode()):
+        return HttpResponse(status=401)
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,57 @@
+from django.db import migrations
+
+from apis.partitions import FIRST_HISTORY_YEAR, HISTORY_TABLE, ensure_history_partitions
+
+
+def partition_history(apps, schema_editor):
+    """
+    On PostgreSQL, rebuild apis_historicalprice as a table range-partitioned
+    by year on `date`. The partition key has to be part of every unique
+    constraint, so the primary key becomes (id, date) and (coin_id, date)
+    stays the unique composite index used for upserts. SQLite is left as is.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+
+    old = f"{HISTORY_TABLE}_unpartitioned"
+    seq = f"{HISTORY_TABLE}_part_id_seq"
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {HISTORY_TABLE} RENAME TO {old}")
+        cursor.execute(f"CREATE SEQUENCE {seq}")
+        cursor.execute(f"""
+            CREATE TABLE {HISTORY_TABLE} (
+                id bigint NOT NULL DEFAULT nextval('{seq}'),
+                date date NOT NULL,
+                price numeric(30, 10) NOT NULL,
+                coin_id bigint NOT NULL
+                    REFERENCES apis_coin (id) DEFERRABLE INITIALLY DEFERRED,
+                CONSTRAINT {HISTORY_TABLE}_id_date_pk PRIMARY KEY (id, date),
+                CONSTRAINT {HISTORY_TABLE}_coin_date_uniq UNIQUE (coin_id, date)
+            ) PARTITION BY RANGE (date)
+        """)
+        cursor.execute(f"CREATE TABLE {HISTORY_TABLE}_default PARTITION OF {HISTORY_TABLE} DEFAULT")
+
+    ensure_history_partitions(first_year=FIRST_HISTORY_YEAR, connection=connection)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {HISTORY_TABLE} (id, date, price, coin_id) "
+            f"SELECT id, date, price, coin_id FROM {old}"
+        )
+        cursor.execute(
+            f"SELECT setval('{seq}', COALESCE((SELECT MAX(id) FROM {HISTORY_TABLE}), 0) + 1, false)"
+        )
+        cursor.execute(f"DROP TABLE {old}")
+        cursor.execute(f"ALTER SEQUENCE {seq} OWNED BY {HISTORY_TABLE}.id")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0003_favoritecoin'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_history, migrations.RunPython.noop),
+    ]
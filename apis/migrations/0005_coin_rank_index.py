@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0004_partition_historicalprice'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='coin',
+            index=models.Index(fields=['market_cap_rank', 'id'], name='coin_rank_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0005_coin_rank_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coin',
+            name='history_start',
+            field=models.DateField(null=True),
+        ),
+    ]
@@ -12,6 +12,13 @@ class Coin(models.Model):
     volume = models.DecimalField(max_digits=30, decimal_places=2)
     percent_change_24h = models.FloatField(null=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Earliest day CoinGecko has history for, once a fetch showed the coin is
+    # younger than the window asked for; nothing before it is ever backfilled.
+    history_start = models.DateField(null=True)
+
+    class Meta:
+        # Keyset pagination of the coin listing
+        indexes = [models.Index(fields=["market_cap_rank", "id"], name="coin_rank_id_idx")]
 
 class HistoricalPrice(models.Model):
     coin = models.ForeignKey(Coin, related_name='history', on_delete=models.CASCADE)
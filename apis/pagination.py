@@ -0,0 +1,63 @@
+import base64
+import json
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import replace_query_param
+from .encoders import COIN_FIELDS
+
+DEFAULT_PAGE_SIZE = 10
+# Hard cap per response; also CoinGecko's own markets page size.
+MAX_PAGE_SIZE = 250
+
+
+def encode_cursor(after):
+    """Opaque cursor for a (market_cap_rank, id) keyset position."""
+    return base64.urlsafe_b64encode(json.dumps(after, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        rank, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if (rank is not None and not isinstance(rank, int)) or not isinstance(pk, int):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise ValidationError({"cursor": "Invalid cursor."})
+    return rank, pk
+
+
+def parse_fields(value):
+    """
+    Sparse fieldset from `fields=a,b`, in serializer field order, or None for all.
+    """
+    if not value:
+        return None
+    requested = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = requested - set(COIN_FIELDS)
+    if unknown:
+        raise ValidationError({"fields": f"Unknown fields: {', '.join(sorted(unknown))}."})
+    return tuple(name for name in COIN_FIELDS if name in requested)
+
+
+def parse_listing_params(params):
+    """
+    Validate coin listing query params.
+
+    Returns:
+        (page_size, after, fields) where after is the decoded cursor or None
+    """
+    n = params.get("n", DEFAULT_PAGE_SIZE)
+    try:
+        n = int(n)
+    except ValueError:
+        n = DEFAULT_PAGE_SIZE
+    n = max(1, min(n, MAX_PAGE_SIZE))
+
+    cursor = params.get("cursor")
+    after = decode_cursor(cursor) if cursor else None
+    return n, after, parse_fields(params.get("fields"))
+
+
+def next_link(url, after):
+    """Link header value pointing at the page after `after`, or None."""
+    if after is None:
+        return None
+    return f'<{replace_query_param(url, "cursor", encode_cursor(after))}>; rel="next"'
@@ -0,0 +1,41 @@
+from datetime import date
+from django.db import connection as default_connection
+
+HISTORY_TABLE = "apis_historicalprice"
+# CoinGecko history starts in 2013; earlier rows land in the default partition.
+FIRST_HISTORY_YEAR = 2013
+
+
+def is_partitioned(connection=default_connection, table=HISTORY_TABLE):
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def ensure_history_partitions(years_ahead=1, first_year=None, connection=default_connection):
+    """
+    Create the yearly range partitions of HistoricalPrice that don't exist yet,
+    up to `years_ahead` years past the current one. No-op outside PostgreSQL.
+
+    Returns:
+        list of partition table names that now exist
+    """
+    if not is_partitioned(connection):
+        return []
+
+    this_year = date.today().year
+    names = []
+    with connection.cursor() as cursor:
+        for year in range(first_year or this_year, this_year + years_ahead + 1):
+            name = f"{HISTORY_TABLE}_y{year}"
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {HISTORY_TABLE} "
+                f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+            )
+            names.append(name)
+    return names
@@ -1,18 +1,110 @@
 import re
+from collections import namedtuple
 from datetime import date, timedelta
 from .models import Coin
+from .cache import market_version
+from .aggregation import MAX_HISTORY_DAYS, history_series
 
 # Precompiled regex for efficiency
 PRICE_RE = re.compile(r"(?:price|worth|how much).*?(?P<coin>\w+)", re.I)
 TREND_RE = re.compile(r"(?:(?P<days>\d+)\s*(?:day|d)\s*(?:trend|chart)|last\s(?P<days2>\d+)\s*days)", re.I)
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Trend answers feed a small chat-panel sparkline
+QA_MAX_POINTS = 120
+
+# Extra names users type for coins, keyed by coingecko_id
+COIN_ALIASES = {
+    "bitcoin": ["xbt"],
+    "ethereum": ["ether"],
+    "ripple": ["xrp"],
+    "binancecoin": ["bnb", "binance coin"],
+    "tether": ["usdt"],
+    "usd-coin": ["usdc"],
+}
+
+# Words from the query templates themselves; never matched as a one-word
+# symbol or alias so e.g. a coin with symbol "THE" can't hijack a query.
+STOPWORDS = {
+    "price", "of", "is", "the", "what", "whats", "how", "much", "worth", "a",
+    "show", "me", "trend", "chart", "day", "days", "d", "last", "for", "in",
+}
+
+CoinEntry = namedtuple(
+    "CoinEntry", ["id", "coingecko_id", "name", "symbol", "market_cap_rank", "last_price"]
+)
+
+
+class CoinIndex:
+    """
+    Token-phrase hash index over coin names, symbols and aliases.
+
+    Matching is on whole tokens, so "eth" does not match "tether". When several
+    phrases match, the longest phrase wins ("bitcoin cash" over "bitcoin"), then
+    the best market_cap_rank.
+    """
+
+    def __init__(self, coins, version=None):
+        self.version = version
+        self.phrases = {}
+        self.max_len = 1
+        for coin in coins:
+            for phrase in self._phrases_for(coin):
+                self.phrases.setdefault(phrase, []).append(coin)
+                self.max_len = max(self.max_len, len(phrase))
+        for matches in self.phrases.values():
+            matches.sort(key=self._rank)
+
+    @staticmethod
+    def _rank(coin):
+        return (coin.market_cap_rank is None, coin.market_cap_rank or 0)
+
+    @staticmethod
+    def _phrases_for(coin):
+        names = [coin.name, coin.symbol, coin.coingecko_id.replace("-", " ")]
+        names += COIN_ALIASES.get(coin.coingecko_id, [])
+        for name in names:
+            tokens = tuple(TOKEN_RE.findall(name.lower()))
+            if tokens and not (len(tokens) == 1 and tokens[0] in STOPWORDS):
+                yield tokens
+
+    def lookup(self, text):
+        tokens = TOKEN_RE.findall(text.lower())
+        best = None
+        for i in range(len(tokens)):
+            for length in range(min(self.max_len, len(tokens) - i), 0, -1):
+                matches = self.phrases.get(tuple(tokens[i:i + length]))
+                if not matches:
+                    continue
+                key = (-length, self._rank(matches[0]))
+                if best is None or key < best[0]:
+                    best = (key, matches[0])
+                break
+        return best[1] if best else None
+
+
+_index = None
+
+
+def get_coin_index():
+    """
+    Return the process-wide coin index, rebuilding it when fetch_top_coins
+    has bumped the market version since it was built.
+    """
+    global _index
+    version = market_version()
+    if _index is None or _index.version != version:
+        coins = [
+            CoinEntry(*row)
+            for row in Coin.objects.values_list(*CoinEntry._fields)
+        ]
+        _index = CoinIndex(coins, version=version)
+    return _index
+
 
 def resolve_coin(text: str):
-    """Try to resolve a coin by matching name or symbol in user text."""
-    text = text.lower()
-    for coin in Coin.objects.all():
-        if coin.name.lower() in text or coin.symbol.lower() in text:
-            return coin
-    return None
+    """Try to resolve a coin by matching name, symbol or alias in user text."""
+    return get_coin_index().lookup(text)
 
 def handle_query(text: str):
     """Process a user query and return structured response for chat assistant panel."""
@@ -37,18 +129,14 @@ def handle_query(text: str):
         days = int(days) if days else 7
         coin = resolve_coin(text)
         if coin:
+            days = min(days, MAX_HISTORY_DAYS)
             start_date = date.today() - timedelta(days=days)
-            history = (
-                coin.history
-                .filter(date__gte=start_date)
-                .order_by("date")
-                .values("date", "price")
-            )
+            history = history_series(coin.id, start_date, max_points=QA_MAX_POINTS)
             return {
                 "type": "trend",
                 "coin": coin.coingecko_id,
                 "answer": f"📈 Showing {days}-day trend for {coin.name}",
-                "data": list(history)
+                "data": [{"date": row["date"], "price": float(row["price"])} for row in history]
             }
         return {"type": "unknown", "answer": "Coin not found for trend query."}
 
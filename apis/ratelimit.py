@@ -0,0 +1,144 @@
+import time
+import redis
+from email.utils import parsedate_to_datetime
+from django.conf import settings
+
+_redis = None
+_scripts = {}
+
+
+def get_redis():
+    """Return a process-wide Redis client for the broker instance."""
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis
+
+
+def _script(source):
+    """Registered Lua script, cached per process (invoked via EVALSHA)."""
+    if source not in _scripts:
+        _scripts[source] = get_redis().register_script(source)
+    return _scripts[source]
+
+
+# GCRA-style token bucket: instead of blocking until a token is free, each
+# caller reserves the next free slot and gets back how long to wait for it.
+# KEYS[1] = theoretical arrival time (ms), KEYS[2] = cooldown-until (ms)
+# ARGV[1] = now (ms), ARGV[2] = ms per token, ARGV[3] = burst size
+RESERVE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+local cooldown = tonumber(redis.call('GET', KEYS[2]) or 0)
+local base = math.max(tat, now, cooldown)
+local slot = math.max(now, cooldown, base - (burst - 1) * interval)
+local new_tat = base + interval
+redis.call('SET', KEYS[1], new_tat, 'PX', math.max(new_tat - now, 1) + 60000)
+return slot - now
+"""
+
+# Same bucket, but only takes a token if one is free right now; otherwise
+# leaves the bucket untouched and returns the ms until one frees up.
+# KEYS[1] = theoretical arrival time (ms); ARGV as for RESERVE_SCRIPT
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local base = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+local allow_at = base - (burst - 1) * interval
+if allow_at > now then
+    return allow_at - now
+end
+redis.call('SET', KEYS[1], base + interval, 'PX', base + interval - now)
+return 0
+"""
+
+# KEYS[1] = cooldown-until (ms); ARGV[1] = now (ms), ARGV[2] = cooldown (ms)
+# A zero cooldown (Retry-After: 0 or a past date) sets nothing: PX 0 is an error.
+PENALIZE_SCRIPT = """
+local until_ms = tonumber(ARGV[1]) + tonumber(ARGV[2])
+local current = tonumber(redis.call('GET', KEYS[1]) or 0)
+if tonumber(ARGV[2]) > 0 and until_ms > current then
+    redis.call('SET', KEYS[1], until_ms, 'PX', tonumber(ARGV[2]))
+end
+return math.max(until_ms, current) - tonumber(ARGV[1])
+"""
+
+
+class TokenBucket:
+    """
+    Token bucket shared by every process through Redis.
+
+    reserve() never sleeps: it books the next free slot and returns the delay
+    in seconds, which callers pass to Celery as a countdown. try_acquire() is
+    the non-booking variant used to shed requests.
+    """
+
+    def __init__(self, name, rate_per_minute, burst=1):
+        self.tat_key = f"ratelimit:{name}:tat"
+        self.cooldown_key = f"ratelimit:{name}:cooldown"
+        self.interval_ms = max(1, int(60000 / rate_per_minute))
+        self.burst = max(1, burst)
+
+    @staticmethod
+    def _now_ms():
+        return int(time.time() * 1000)
+
+    def reserve(self):
+        """Book one call and return the seconds to wait before making it."""
+        delay_ms = _script(RESERVE_SCRIPT)(
+            keys=[self.tat_key, self.cooldown_key],
+            args=[self._now_ms(), self.interval_ms, self.burst],
+        )
+        return max(0.0, float(delay_ms) / 1000.0)
+
+    def try_acquire(self):
+        """
+        Take a token if one is free now.
+
+        Returns:
+            0 on success, else the seconds until a token becomes free
+        """
+        wait_ms = _script(ACQUIRE_SCRIPT)(
+            keys=[self.tat_key],
+            args=[self._now_ms(), self.interval_ms, self.burst],
+        )
+        return max(0.0, float(wait_ms) / 1000.0)
+
+    def penalize(self, seconds):
+        """Block all reservations for `seconds`, e.g. after a 429 from upstream."""
+        remaining_ms = _script(PENALIZE_SCRIPT)(
+            keys=[self.cooldown_key],
+            args=[self._now_ms(), int(seconds * 1000)],
+        )
+        return max(0.0, float(remaining_ms) / 1000.0)
+
+    def cooldown_remaining(self):
+        """Seconds left on an upstream-imposed cooldown, 0 if none."""
+        until_ms = get_redis().get(self.cooldown_key)
+        if until_ms is None:
+            return 0.0
+        return max(0.0, (float(until_ms) - self._now_ms()) / 1000.0)
+
+
+def parse_retry_after(value, default=60):
+    """Parse a Retry-After header (delta-seconds or HTTP date) into seconds."""
+    if not value:
+        return default
+    try:
+        return max(0, int(value))
+    except ValueError:
+        pass
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+coingecko_limiter = TokenBucket(
+    "coingecko",
+    rate_per_minute=settings.COINGECKO_CALLS_PER_MINUTE,
+    burst=settings.COINGECKO_BURST,
+)
@@ -0,0 +1,31 @@
+import time
+import orjson
+from rest_framework.renderers import JSONRenderer
+from .metrics import record_render
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer on orjson, with the same compact output as DRF's: datetimes,
+    Decimals and anything else orjson doesn't know natively go through DRF's
+    encoder. The only textual difference is float formatting: orjson switches
+    to exponent notation at different magnitudes and writes the exponent
+    without a sign or padding (0.0000123 for 1.23e-05, -1.2345e-7 for
+    -1.2345e-07, 1e16 for 1e+16). Both parse back to the same float.
+    Indented output (`Accept: ...; indent=4`) falls back to the stock renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        start = time.perf_counter()
+        body = orjson.dumps(data, default=self.encoder_class().default, option=_OPTIONS)
+        # Same escaping as JSONRenderer: these are valid JSON but not valid JavaScript
+        body = body.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        record_render(time.perf_counter() - start)
+        return body
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+import time
+import redis.asyncio as aioredis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from .ratelimit import get_redis
+from .cache import market_version, user_favorites
+from .authentication import aauthenticate
+
+logger = logging.getLogger(__name__)
+
+TICK_CHANNEL = "ticks:prices"
+LAST_TICK_KEY = "ticks:last"
+KEEPALIVE_SECONDS = 15
+CLIENT_QUEUE_SIZE = 16
+
+
+def publish_tick(coins):
+    """
+    Publish the compact diff of a market refresh to Redis pub/sub.
+
+    Only coins whose price or 24h change moved since the last published tick
+    are included, as [id, coingecko_id, price, percent_change_24h] rows.
+    """
+    coins = list(coins)
+    if not coins:
+        return 0
+    client = get_redis()
+    current = {
+        c.coingecko_id: [c.pk, c.coingecko_id, format(c.last_price, "f"), c.percent_change_24h]
+        for c in coins
+    }
+    previous = client.hmget(LAST_TICK_KEY, list(current))
+    changed = [
+        row for row, prev in zip(current.values(), previous)
+        if prev is None or json.loads(prev)[2:] != row[2:]
+    ]
+    if not changed:
+        return 0
+
+    message = json.dumps({"v": market_version(), "ts": int(time.time()), "c": changed})
+    pipe = client.pipeline()
+    pipe.hset(LAST_TICK_KEY, mapping={row[1]: json.dumps(row) for row in changed})
+    pipe.publish(TICK_CHANNEL, message)
+    pipe.execute()
+    return len(changed)
+
+
+class TickHub:
+    """
+    One Redis subscription per process, fanned out to every connected client
+    through bounded asyncio queues. A slow client drops ticks, never blocks.
+    """
+
+    def __init__(self):
+        self.queues = set()
+        self._task = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.queues.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.queues.discard(queue)
+
+    async def _run(self):
+        while self.queues:
+            client = aioredis.from_url(settings.REDIS_URL)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(TICK_CHANNEL)
+                    while self.queues:
+                        message = await pubsub.get_message(
+                            ignore_subscribe_messages=True, timeout=KEEPALIVE_SECONDS
+                        )
+                        if message is not None:
+                            self._fan_out(message["data"])
+            except (aioredis.RedisError, OSError) as e:
+                logger.warning(f"Tick subscription lost, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await client.aclose()
+
+    def _fan_out(self, data):
+        tick = json.loads(data)
+        for queue in list(self.queues):
+            try:
+                queue.put_nowait(tick)
+            except asyncio.QueueFull:
+                pass
+
+
+hub = TickHub()
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _events(user_id=None):
+    queue = hub.subscribe()
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                tick = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if user_id is not None:
+                favorites = await sync_to_async(user_favorites)(user_id)
+                tick = {**tick, "c": [row for row in tick["c"] if row[0] in favorites]}
+                if not tick["c"]:
+                    continue
+            yield _sse("tick", tick)
+    finally:
+        hub.unsubscribe(queue)
+
+
+async def price_stream(request):
+    """
+    GET /api/stream/prices/?token=<access token>&favorites=1
+    Server-Sent Events feed of price diffs published after each market refresh,
+    for authenticated users only; EventSource can't send headers, so the
+    access token may be passed as ?token=. With favorites=1 only the user's
+    favorite coins are sent.
+    Answers 501 unless served under ASGI (see jetapult_crypto_backend/asgi.py):
+    WSGI drains an async body to the end before sending it, and this one never ends.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"detail": "The price stream is only served over ASGI."}, status=501)
+    user = await aauthenticate(request, allow_query_token=True)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    user_id = user.id if request.GET.get("favorites") in ("1", "true") else None
+
+    response = StreamingHttpResponse(_events(user_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
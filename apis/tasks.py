@@ -1,121 +1,389 @@
-import os
+import math
 import time
-import logging
 import requests
-from datetime import date, datetime
-from decimal import Decimal
+from uuid import uuid4
 from celery import shared_task
-from django.db import transaction
-from .models import Coin, HistoricalPrice
+from django.conf import settings
+from django.core.cache import cache
+from celery.exceptions import Retry
+from .models import Coin
+from .ingest import plan_history_sync, upsert_coins, upsert_history
+from .ratelimit import coingecko_limiter, parse_retry_after
+from .locks import InFlightLock
+from . import coingecko
+from . import partitions
+from . import analytics
+from . import tiers
 from celery.utils.log import get_task_logger
 
 logger = get_task_logger(__name__)
 
-COINGECKO_API_KEY = os.getenv("COINGECKO_APIKEY")
-COINGECKO_BASE_URL = "https://api.coingecko.com/api/v3"
+MARKETS_MAX_PER_PAGE = 250
+# Upper bound for fetch_top_coins(n); 20 markets pages
+MAX_TRACKED_COINS = 5000
+# Give the last scheduled history fetch time to finish before recomputing
+ANALYTICS_DELAY = 120
+# Set while analytics queued by a cache miss are being computed; clients are
+# told to retry after the same interval
+ANALYTICS_PENDING_KEY = "analytics:pending"
+ANALYTICS_RETRY_AFTER = 30
+# How long a history fetch may run (past its countdown) before its lock lapses
+HISTORY_LOCK_TTL = 15 * 60
 
 
-def _headers():
-    headers = {"accept": "application/json"}
-    if COINGECKO_API_KEY:
-        headers["x-cg-demo-api-key"] = COINGECKO_API_KEY
-    return headers
+def _throttled_countdown(resp):
+    """
+    Push back the shared CoinGecko bucket after a 429 and return a countdown
+    that lands after the cooldown. Other status codes keep the fixed backoff.
+    """
+    retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+    coingecko_limiter.penalize(retry_after)
+    return coingecko_limiter.reserve()
 
 
-@shared_task(bind=True, max_retries=3)
-def fetch_top_coins(self, n=10):
+def _history_lock(coingecko_id):
+    """At most one history fetch per coin queued or running at a time."""
+    return InFlightLock(f"history:{coingecko_id}", HISTORY_LOCK_TTL)
+
+
+def _fetch_markets_page(task, page, per_page, ids=None):
     """
-    Fetch top N coins by market cap and store/update them in DB.
+    GET one /coins/markets page, optionally limited to `ids`. 429s, 5xx and
+    network errors retry `task` (so only this page is retried); other errors
+    return None.
     """
-    url = f"{COINGECKO_BASE_URL}/coins/markets"
-    params = {"vs_currency": "usd", "order": "market_cap_desc", "per_page": n, "page": 1,"x-cg-demo-api-key": COINGECKO_API_KEY}
-    flag = False
-    
     try:
-        resp = requests.get(url, params=params, headers=_headers(), timeout=10)
+        resp = coingecko.markets(per_page=per_page, page=page, ids=ids)
         resp.raise_for_status()
     except requests.HTTPError as e:
-        logger.error(f"HTTPError fetching top coins: {resp.status_code} {resp.text}")
-        if resp.status_code >= 500 or resp.status_code == 429:
-            raise self.retry(exc=e, countdown=10)
-        return
+        logger.error(f"HTTPError fetching markets page {page}: {resp.status_code} {resp.text}")
+        if resp.status_code == 429:
+            raise task.retry(exc=e, countdown=_throttled_countdown(resp))
+        if resp.status_code >= 500:
+            raise task.retry(exc=e, countdown=10)
+        return None
     except requests.RequestException as e:
-        logger.error(f"RequestException fetching top coins: {e}")
-        raise self.retry(exc=e, countdown=10)
-    
-    data = resp.json()
+        logger.error(f"RequestException fetching markets page {page}: {e}")
+        raise task.retry(exc=e, countdown=10)
+    return resp.json()
+
+
+def _store_markets(data):
+    """Upsert one markets page and schedule history backfill for its new coins."""
+    new_ids = upsert_coins(data)
+    if new_ids:
+        logger.info(f"Scheduling history backfill for {len(new_ids)} new coins.")
+        fetch_all_coins_history.delay(days=30, coin_ids=new_ids)
+    return new_ids
+
+
+@shared_task(bind=True, max_retries=3)
+def fetch_top_coins(self, n=10):
+    """
+    Fetch top N coins by market cap and store/update them in DB.
+    Each page is written in one bulk upsert; history backfill is only
+    scheduled for coins that were not in the DB before.
+
+    Page 1 is fetched here when the shared CoinGecko bucket has a slot free
+    now, and otherwise queued as a fetch_markets_page task for its slot. For N
+    above one markets page, the remaining pages are handed to
+    fetch_markets_page tasks, each booked its own slot on the bucket. They run
+    in parallel across workers within the quota, each is stored as it arrives,
+    and a failed page retries alone.
+    """
+    n = max(1, min(int(n), MAX_TRACKED_COINS))
+    per_page = min(n, MARKETS_MAX_PER_PAGE)
+    pages = math.ceil(n / per_page)
 
-    if Coin.objects.count() == 0:
-        flag = True
-
-    with transaction.atomic():
-        for c in data:
-            Coin.objects.update_or_create(
-                coingecko_id=c["id"],
-                defaults={
-                    "symbol": c["symbol"].upper(),
-                    "name": c["name"],
-                    "market_cap_rank": c.get("market_cap_rank"),
-                    "last_price": Decimal(str(c["current_price"])),
-                    "volume": Decimal(str(c["total_volume"])),
-                    "percent_change_24h": c.get("price_change_percentage_24h"),
-                },
+    # The market refresh jumps the queue of reserved history slots, but still
+    # honours a 429 cooldown and counts against the shared quota.
+    cooldown = coingecko_limiter.cooldown_remaining()
+    if cooldown > 0:
+        logger.warning(f"CoinGecko cooldown active, deferring top coins by {cooldown:.0f}s.")
+        raise self.retry(countdown=cooldown)
+    delay = coingecko_limiter.reserve()
+    if delay > 0:
+        fetch_markets_page.apply_async((1, per_page), countdown=delay)
+        logger.info(f"CoinGecko bucket busy, scheduled markets page 1 in {delay:.0f}s.")
+    else:
+        data = _fetch_markets_page(self, 1, per_page)
+        if data is None:
+            return
+        _store_markets(data)
+        logger.info(f"Successfully fetched and stored {len(data)} top coins (page 1 of {pages}).")
+
+    for page in range(2, pages + 1):
+        limit = n - (page - 1) * per_page
+        fetch_markets_page.apply_async(
+            (page, per_page, limit), countdown=coingecko_limiter.reserve()
+        )
+    if pages > 1:
+        logger.info(f"Scheduled markets pages 2-{pages} for the top {n} coins.")
+
+
+def _revalidate_key(coingecko_id):
+    return f"revalidating:{coingecko_id}"
+
+
+def revalidate_stale(coins):
+    """
+    Stale-while-revalidate for market reads: queue a refresh of the served
+    coins whose data is older than their tier's refresh interval plus
+    MARKET_STALE_GRACE, i.e. coins the beat schedule should already have
+    refreshed, without waiting for it. Each coin is queued at most once per
+    MARKET_STALE_GRACE window, however many stale reads come in, and nothing
+    is queued during a 429 cooldown. The refresh books its own slot on the
+    shared CoinGecko bucket.
+
+    Args:
+        coins: (coingecko_id, updated_at timestamp, market_cap_rank) tuples
+            that were served
+    Returns:
+        list of coingecko_ids queued for a refresh
+    """
+    grace = settings.MARKET_STALE_GRACE
+    now = time.time()
+    stale = [
+        coingecko_id for coingecko_id, updated_at, rank in coins
+        if now - updated_at >= tiers.refresh_interval(rank) + grace
+    ]
+    if not stale:
+        return []
+    pending = cache.get_many([_revalidate_key(coingecko_id) for coingecko_id in stale])
+    stale = [coingecko_id for coingecko_id in stale if _revalidate_key(coingecko_id) not in pending]
+    if not stale or coingecko_limiter.cooldown_remaining() > 0:
+        return []
+
+    keys = [_revalidate_key(coingecko_id) for coingecko_id in stale]
+    cache.set_many(dict.fromkeys(keys, True), grace)
+    try:
+        for i in range(0, len(stale), MARKETS_MAX_PER_PAGE):
+            fetch_coins_by_ids.apply_async(
+                (stale[i:i + MARKETS_MAX_PER_PAGE],), countdown=coingecko_limiter.reserve()
             )
-    
-    if flag:
-        fetch_all_coins_history.delay(days=30, sleep_between_coins=30)
-    logger.info(f"Successfully fetched and stored {len(data)} top coins.")
+    except Exception as e:
+        cache.delete_many(keys)
+        logger.error(f"Failed to queue refresh of {len(stale)} stale coins: {e}")
+        return []
+    logger.info(f"Queued a background refresh of {len(stale)} stale coins.")
+    return stale
+
+
+def queue_market_analytics():
+    """
+    Queue compute_market_analytics for a read that found no analytics cached,
+    at most once per ANALYTICS_RETRY_AFTER however many reads miss.
+
+    Returns:
+        True if the task was queued
+    """
+    if not cache.add(ANALYTICS_PENDING_KEY, True, timeout=ANALYTICS_RETRY_AFTER):
+        return False
+    try:
+        compute_market_analytics.delay()
+    except Exception as e:
+        cache.delete(ANALYTICS_PENDING_KEY)
+        logger.error(f"Failed to queue market analytics: {e}")
+        return False
+    return True
+
+
+@shared_task(bind=True, max_retries=3)
+def fetch_markets_page(self, page, per_page=MARKETS_MAX_PER_PAGE, limit=None):
+    """
+    Fetch and store one /coins/markets page; scheduled by fetch_top_coins
+    with a countdown from the shared CoinGecko bucket.
+
+    Args:
+        page: 1-based markets page
+        per_page: Page size used for every page of this refresh
+        limit: Keep only the first `limit` coins (the tail of the last page)
+    """
+    # Like fetch_coin_history, re-book rather than call upstream during a
+    # cooldown that started after this page was scheduled.
+    if coingecko_limiter.cooldown_remaining() > 0:
+        countdown = coingecko_limiter.reserve()
+        logger.info(f"CoinGecko cooldown active, rescheduling markets page {page} in {countdown:.0f}s.")
+        fetch_markets_page.apply_async((page, per_page, limit), countdown=countdown)
+        return
+
+    data = _fetch_markets_page(self, page, per_page)
+    if data is None:
+        return
+    data = data[:limit]
+    new_ids = _store_markets(data)
+    logger.info(f"Stored markets page {page}: {len(data)} coins, {len(new_ids)} new.")
+    return {"page": page, "coins": len(data), "new": len(new_ids)}
 
 
 @shared_task(bind=True, max_retries=3)
-def fetch_all_coins_history(self, days=30, sleep_between_coins=30):
+def fetch_coins_by_ids(self, coingecko_ids):
+    """
+    Refresh market data for specific coins with one /coins/markets?ids= call
+    (at most MARKETS_MAX_PER_PAGE ids). Scheduled by refresh_tier and by
+    revalidate_stale for coins served stale.
+    """
+    data = _fetch_markets_page(self, 1, len(coingecko_ids), ids=coingecko_ids)
+    if data is None:
+        return
+    _store_markets(data)
+    return {"coins": len(data)}
+
+
+@shared_task
+def refresh_tier(tier):
+    """
+    Refresh every coin currently in `tier` (see apis.tiers), in batches of
+    MARKETS_MAX_PER_PAGE ids, each batch queued for the slot it booked on
+    the shared CoinGecko bucket. Like the market refresh, tier refreshes jump
+    the queue of reserved history slots but count against the shared quota.
+    A refresh during a 429 cooldown is skipped; the next tick catches up.
+    """
+    cooldown = coingecko_limiter.cooldown_remaining()
+    if cooldown > 0:
+        logger.warning(f"CoinGecko cooldown active, skipping {tier} tier refresh.")
+        return
+
+    ids = tiers.assign_tiers()[tier]
+    for i in range(0, len(ids), MARKETS_MAX_PER_PAGE):
+        fetch_coins_by_ids.apply_async(
+            args=[ids[i:i + MARKETS_MAX_PER_PAGE]], countdown=coingecko_limiter.reserve()
+        )
+    logger.info(f"Refreshing {len(ids)} {tier} coins.")
+    return len(ids)
+
+
+@shared_task
+def fetch_tier_history(tier_names, days=30):
+    """
+    Incremental history sync for the coins in the given tiers, so hot and
+    warm coins can be synced daily and the cold tail less often.
+    """
+    assigned = tiers.assign_tiers()
+    coin_ids = [cid for name in tier_names for cid in assigned[name]]
+    if coin_ids:
+        fetch_all_coins_history.delay(days=days, coin_ids=coin_ids)
+    return len(coin_ids)
+
+
+@shared_task(bind=True, max_retries=3)
+def fetch_all_coins_history(self, days=30, sleep_between_coins=30, coin_ids=None, incremental=True):
     """
     Enqueue or fetch historical prices for all coins in the database.
+    Each fetch is given a countdown from the shared CoinGecko token bucket,
+    so this task returns immediately instead of sleeping between coins.
 
     Args:
         days: Number of days of historical data to fetch per coin
-        sleep_between_coins: Optional delay between scheduling each coin
+        sleep_between_coins: Ignored; kept so queued calls with the old
+            positional arguments still run. Pacing comes from the rate limiter.
+        coin_ids: Optional list of CoinGecko IDs to limit the fetch to
+        incremental: Only fetch the days missing since each coin's last stored
+            row; coins without history or with gaps still get the full window
     """
-    coin_ids = list(Coin.objects.values_list("coingecko_id", flat=True))
-    if not coin_ids:
+    if incremental:
+        plan = plan_history_sync(days, coin_ids=coin_ids)
+    else:
+        if coin_ids is None:
+            coin_ids = list(Coin.objects.values_list("coingecko_id", flat=True))
+        plan = {coingecko_id: days for coingecko_id in coin_ids}
+    if not plan:
         logger.info("No coins found to fetch history for.")
         return
 
-    logger.info(f"Scheduling history fetch for {len(coin_ids)} coins (days={days}).")
-    for coingecko_id in coin_ids:
+    full = sum(1 for d in plan.values() if d == days)
+    logger.info(
+        f"Scheduling history fetch for {len(plan)} coins (days={days}): "
+        f"{full} full, {len(plan) - full} incremental."
+    )
+    countdown = 0
+    in_flight = 0
+    for coingecko_id, fetch_days in plan.items():
+        # The lock is taken with the task's own id, so the task inherits it
+        lock = _history_lock(coingecko_id)
+        task_id = uuid4().hex
         try:
-            fetch_coin_history.delay(coingecko_id, days=days)
+            if not lock.acquire(task_id):
+                in_flight += 1
+                continue
+            countdown = coingecko_limiter.reserve()
+            lock.extend(task_id, countdown)
+            fetch_coin_history.apply_async(
+                (coingecko_id,), {"days": fetch_days}, countdown=countdown, task_id=task_id,
+            )
         except Exception as e:
             logger.error(f"Failed to schedule history for {coingecko_id}: {e}")
-        if sleep_between_coins > 0:
-            time.sleep(sleep_between_coins)
+            # Nothing was queued to release it; don't block the coin until the TTL
+            try:
+                lock.release(task_id)
+            except Exception as release_error:
+                logger.warning(f"Could not release history lock for {coingecko_id}: {release_error}")
+    if in_flight:
+        logger.info(f"Skipped {in_flight} coins with a history fetch already queued or running.")
+    logger.info(f"History fetches scheduled; last one runs in {countdown:.0f}s.")
+    compute_market_analytics.apply_async(countdown=countdown + ANALYTICS_DELAY)
 
 @shared_task(bind=True, max_retries=3)
-def fetch_coin_history(self, coingecko_id, days=30, sleep_interval=0.1):
+def fetch_coin_history(self, coingecko_id, days=30, lock_token=None):
     """
     Fetch historical prices for a coin from Coingecko API and store them.
-    Includes retry logic and rate-limiting delays.
+    Points are collapsed to one row per day and written in a single bulk upsert.
+    Holds the coin's in-flight lock from scheduling until it finishes, through
+    retries and cooldown re-bookings; a second fetch for the same coin exits.
     
     Args:
         coingecko_id: The CoinGecko ID of the coin
         days: Number of days of historical data to fetch
-        sleep_interval: Delay between processing each price point (in seconds)
+        lock_token: Lock owner carried over from a re-booked run; defaults
+            to this task's id
     """
-    url = f"{COINGECKO_BASE_URL}/coins/{coingecko_id}/market_chart"
-    logger.info(f"Fetching history for { url} days")
-    params = {"vs_currency": "usd", "days": days, "x-cg-demo-api-key": COINGECKO_API_KEY}
+    token = lock_token or self.request.id or uuid4().hex
+    lock = _history_lock(coingecko_id)
+    if not lock.acquire(token):
+        logger.info(f"History fetch for {coingecko_id} already in flight, skipping.")
+        return
+
+    logger.info(f"Fetching {days} days of history for {coingecko_id}")
+
+    # Our slot was booked when this task was scheduled; only a 429 cooldown
+    # that started since then makes us re-book instead of calling upstream.
+    # The re-booked run takes the lock over with our token.
+    if coingecko_limiter.cooldown_remaining() > 0:
+        countdown = coingecko_limiter.reserve()
+        logger.info(f"CoinGecko cooldown active, rescheduling {coingecko_id} in {countdown:.0f}s.")
+        lock.extend(token, countdown)
+        fetch_coin_history.apply_async(
+            (coingecko_id,), {"days": days, "lock_token": token}, countdown=countdown,
+        )
+        return
+
+    keep_lock = False
+    try:
+        return _fetch_coin_history(self, coingecko_id, days)
+    except Retry as e:
+        # Retries run under the same task id, so the retry picks the lock back up
+        keep_lock = True
+        lock.extend(token, e.when if isinstance(e.when, (int, float)) else 0)
+        raise
+    finally:
+        if not keep_lock:
+            lock.release(token)
 
+
+def _fetch_coin_history(task, coingecko_id, days):
     try:
-        resp = requests.get(url, params=params, headers=_headers(), timeout=10)
+        resp = coingecko.market_chart(coingecko_id, days)
         resp.raise_for_status()
     except requests.HTTPError as e:
         logger.error(f"HTTPError fetching history for {coingecko_id}: {resp.status_code} {resp.text}")
-        if resp.status_code >= 500 or resp.status_code == 429:
-            raise self.retry(exc=e, countdown=30)
+        if resp.status_code == 429:
+            raise task.retry(exc=e, countdown=_throttled_countdown(resp))
+        if resp.status_code >= 500:
+            raise task.retry(exc=e, countdown=30)
         return
     except requests.RequestException as e:
         logger.error(f"RequestException fetching history for {coingecko_id}: {e}")
-        raise self.retry(exc=e, countdown=10)
+        raise task.retry(exc=e, countdown=10)
 
     data = resp.json()
     prices = data.get("prices", [])
@@ -130,16 +398,32 @@ def fetch_coin_history(self, coingecko_id, days=30, sleep_interval=0.1):
         logger.error(f"Coin {coingecko_id} does not exist in DB.")
         return
 
-    with transaction.atomic():
-        for timestamp, price in prices:
-            dt = datetime.fromtimestamp(timestamp / 1000.0).date()
-            HistoricalPrice.objects.update_or_create(
-                coin=coin,
-                date=dt,
-                defaults={"price": Decimal(str(price))},
-            )
-        # Sleep outside the loop to avoid excessive delays
-        if sleep_interval > 0:
-            time.sleep(sleep_interval)
+    inserted, updated = upsert_history(coin, prices, days=days)
+
+    logger.info(
+        f"Saved history for {coingecko_id}: {len(prices)} points -> "
+        f"{inserted} inserted, {updated} updated."
+    )
+    return {"coin": coingecko_id, "inserted": inserted, "updated": updated}
+
+
+@shared_task
+def compute_market_analytics():
+    """
+    Precompute returns, volatility, moving averages and correlations for
+    every analytics window from the columnar history store, and cache them.
+    """
+    results = analytics.compute_market_analytics()
+    logger.info(f"Computed market analytics for windows {sorted(results)}.")
+
 
-    logger.info(f"Saved {len(prices)} historical prices for {coingecko_id}.")
+@shared_task
+def ensure_history_partitions(years_ahead=1):
+    """
+    Create upcoming yearly HistoricalPrice partitions before rows need them.
+    Does nothing unless the table is partitioned (PostgreSQL).
+    """
+    names = partitions.ensure_history_partitions(years_ahead=years_ahead)
+    if names:
+        logger.info(f"HistoricalPrice partitions present: {', '.join(names)}")
+    return names
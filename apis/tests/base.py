@@ -0,0 +1,78 @@
+import shutil
+import tempfile
+from datetime import date, datetime, time, timedelta
+from unittest import mock
+
+import fakeredis
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apis import history_store, ratelimit
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests"}}
+# Users are created per test; the default hasher is slow on purpose
+FAST_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+def market(i, price=1):
+    """One /coins/markets entry."""
+    return {
+        "id": f"coin-{i}",
+        "symbol": f"c{i}",
+        "name": f"Coin {i}",
+        "market_cap_rank": i + 1,
+        "current_price": price,
+        "total_volume": 100,
+        "price_change_percentage_24h": 1.5,
+    }
+
+
+def daily_points(days_ago, price=10):
+    """market_chart [timestamp_ms, price] points, one at noon per day."""
+    today = date.today()
+    return [
+        [datetime.combine(today - timedelta(days=d), time(12)).timestamp() * 1000, price + d]
+        for d in days_ago
+    ]
+
+
+@override_settings(CACHES=LOCMEM_CACHE, PASSWORD_HASHERS=FAST_HASHERS)
+class RedisTestCase(TestCase):
+    """Runs each test against a fresh fakeredis, an empty cache and history store."""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        for patcher in (
+            mock.patch.object(ratelimit, "_redis", self.redis),
+            mock.patch.object(ratelimit, "_scripts", {}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        store_dir = tempfile.mkdtemp(prefix="history-test-")
+        self.addCleanup(shutil.rmtree, store_dir, ignore_errors=True)
+        settings_override = override_settings(HISTORY_STORE_DIR=store_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        history_store._loaded.clear()
+        cache.clear()
+
+
+class ApiTestCase(RedisTestCase):
+    """RedisTestCase with a user and a client sending their access token."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for("alice")
+        self.user = self.client.user
+        self.token = self.client.token
+
+    def client_for(self, username):
+        """APIClient authenticated as a new user, with .user and .token set."""
+        client = APIClient()
+        client.user = User.objects.create_user(username, password="password123")
+        client.token = str(AccessToken.for_user(client.user))
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {client.token}")
+        return client
@@ -0,0 +1,91 @@
+import math
+from unittest import mock
+
+import numpy as np
+from django.urls import reverse
+
+from apis import analytics, tasks
+from apis.ingest import upsert_coins, upsert_history
+from apis.models import Coin
+
+from .base import ApiTestCase, RedisTestCase, daily_points, market
+
+
+def store(coin, prices):
+    """Daily prices for the last len(prices) days, oldest first."""
+    n = len(prices)
+    points = daily_points(range(n - 1, -1, -1))
+    upsert_history(coin, [[ts, price] for (ts, _), price in zip(points, prices)])
+
+
+@mock.patch("apis.ingest.publish_tick")
+class ComputeWindowTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        upsert_coins([market(i) for i in range(3)])
+        self.coins = list(Coin.objects.order_by("market_cap_rank").values_list("id", "coingecko_id"))
+        a, b, _ = Coin.objects.order_by("market_cap_rank")
+        with self.captureOnCommitCallbacks(execute=True):
+            store(a, [100, 110, 121, 133.1])
+            store(b, [10, 5, 10, 5])
+
+    def test_metrics(self, publish_tick):
+        result = analytics.compute_window(self.coins, 7)
+        self.assertEqual([r["coin"] for r in result["returns"]], ["coin-0", "coin-1", "coin-2"])
+        self.assertAlmostEqual(result["returns"][0]["return"], 0.331)
+        self.assertAlmostEqual(result["returns"][1]["return"], -0.5)
+        # Coins without history come back as nulls, not NaN
+        self.assertIsNone(result["returns"][2]["return"])
+        self.assertIsNone(result["volatility"][2]["volatility"])
+
+        # Constant growth has no volatility
+        self.assertAlmostEqual(result["volatility"][0]["volatility"], 0.0)
+        expected = np.std(np.diff(np.log([10, 5, 10, 5])), ddof=1) * math.sqrt(analytics.TRADING_DAYS)
+        self.assertAlmostEqual(result["volatility"][1]["volatility"], expected)
+
+        averages = result["moving_averages"][1]
+        self.assertEqual(averages["price"], 5.0)
+        self.assertAlmostEqual(averages["sma"], 7.5)
+        self.assertAlmostEqual(averages["ema"], analytics.ema(np.array([[10.0, 5, 10, 5]]), 7)[0, -1])
+
+    def test_correlation_covers_the_top_coins_only(self, publish_tick):
+        with mock.patch.object(analytics, "CORRELATION_COINS", 2):
+            correlation = analytics.compute_window(self.coins, 7)["correlation"]
+        self.assertEqual(correlation["coins"], ["coin-0", "coin-1"])
+        self.assertEqual(len(correlation["matrix"]), 2)
+        self.assertAlmostEqual(correlation["matrix"][1][1], 1.0)
+        # Constant log returns have no variance to correlate
+        self.assertIsNone(correlation["matrix"][0][1])
+
+    def test_ema_carries_missing_days_forward(self, publish_tick):
+        out = analytics.ema(np.array([[np.nan, 2.0, np.nan, 4.0]]), 3)
+        np.testing.assert_allclose(out, [[np.nan, 2.0, 2.0, 3.0]])
+
+
+@mock.patch("apis.ingest.publish_tick")
+class MarketAnalyticsViewTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        upsert_coins([market(0)])
+        self.url = reverse("analytics-returns")
+
+    def test_miss_queues_the_task_once_and_asks_to_retry(self, publish_tick):
+        with mock.patch.object(tasks.compute_market_analytics, "delay") as delay:
+            for _ in range(2):
+                response = self.client.get(self.url, {"days": 30})
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response["Retry-After"], str(tasks.ANALYTICS_RETRY_AFTER))
+        delay.assert_called_once_with()
+
+    def test_serves_the_precomputed_metric(self, publish_tick):
+        analytics.compute_market_analytics()
+        with self.assertNumQueries(1):
+            body = self.client.get(self.url, {"days": 30}).json()
+        self.assertEqual(set(body), {"days", "as_of", "returns"})
+        self.assertEqual(body["returns"], [{"coin": "coin-0", "return": None}])
+
+        body = self.client.get(reverse("analytics-correlation"), {"days": 7}).json()
+        self.assertEqual(body["correlation"]["coins"], ["coin-0"])
+
+    def test_unknown_window(self, publish_tick):
+        self.assertEqual(self.client.get(self.url, {"days": 5}).status_code, 400)
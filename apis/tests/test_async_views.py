@@ -0,0 +1,103 @@
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, AsyncRequestFactory
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apis.authentication import aauthenticate
+from apis.ingest import upsert_coins, upsert_history
+from apis.models import Coin
+from apis.throttling import QAThrottle
+
+from .base import ApiTestCase, daily_points, market
+
+
+class AsyncAuthenticationTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = AsyncRequestFactory()
+
+    def request(self, authorization=None, **params):
+        headers = {"Authorization": authorization} if authorization else {}
+        return self.factory.get("/", params, headers=headers)
+
+    async def test_valid_header_token(self):
+        user = await aauthenticate(self.request(f"Bearer {self.token}"))
+        self.assertEqual(user.pk, self.user.pk)
+
+    async def test_query_token_only_when_allowed(self):
+        self.assertIsNone(await aauthenticate(self.request(token=self.token)))
+        user = await aauthenticate(self.request(token=self.token), allow_query_token=True)
+        self.assertEqual(user.pk, self.user.pk)
+
+    async def test_missing_or_malformed_credentials(self):
+        for authorization in (None, "Bearer", "Bearer a b", "Bearer not-a-jwt", "Basic abc"):
+            with self.subTest(authorization=authorization):
+                self.assertIsNone(await aauthenticate(self.request(authorization)))
+
+    async def test_stale_token_for_inactive_or_deleted_user(self):
+        self.user.is_active = False
+        await self.user.asave()
+        self.assertIsNone(await aauthenticate(self.request(f"Bearer {self.token}")))
+        await self.user.adelete()
+        self.assertIsNone(await aauthenticate(self.request(f"Bearer {self.token}")))
+
+    async def test_expired_token(self):
+        token = AccessToken.for_user(self.user)
+        token.set_exp(lifetime=-timedelta(minutes=1))
+        self.assertIsNone(await aauthenticate(self.request(f"Bearer {token}")))
+
+
+@mock.patch("apis.ingest.publish_tick")
+class AsyncViewParityTests(ApiTestCase):
+    """The async endpoints answer byte for byte like their sync counterparts."""
+
+    def setUp(self):
+        super().setUp()
+        upsert_coins([market(i) for i in range(3)])
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_history(Coin.objects.get(coingecko_id="coin-0"), daily_points(range(0, 40)))
+        self.async_client = AsyncClient()
+        self.headers = {"Authorization": f"Bearer {self.token}"}
+
+    async def assertSameResponse(self, name, args=(), **params):
+        expected = await self.sync_get(reverse(name, args=args), params)
+        response = await self.async_client.get(reverse(f"async-{name}", args=args), params, headers=self.headers)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response.get("ETag"), expected.get("ETag"))
+        self.assertEqual(response.get("Link", "").replace("/async/", "/"), expected.get("Link", ""))
+
+    async def sync_get(self, url, params):
+        return await sync_to_async(self.client.get)(url, params)
+
+    async def test_top_coins(self, publish_tick):
+        await self.assertSameResponse("top-coins", n=2)
+        await self.assertSameResponse("top-coins", n=2, fields="id,name")
+        await self.assertSameResponse("top-coins", n=2, cursor="bad")
+
+    async def test_coin_history(self, publish_tick):
+        await self.assertSameResponse("coin-history", ["coin-0"], days=30)
+        await self.assertSameResponse("coin-history", ["coin-0"], days=40, resolution="week")
+        await self.assertSameResponse("coin-history", ["coin-0"], days=40, max_points=10)
+        await self.assertSameResponse("coin-history", ["nope"], days=30)
+
+    async def test_requires_authentication(self, publish_tick):
+        response = await self.async_client.get(reverse("async-top-coins"))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("WWW-Authenticate", response)
+
+    async def test_qa(self, publish_tick):
+        url = reverse("async-qa")
+        response = await self.async_client.post(url, {"query": "price of coin 1"}, content_type="application/json")
+        self.assertEqual(response.json()["coin"], "coin-1")
+        response = await self.async_client.post(url, {}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+        with mock.patch.object(QAThrottle, "burst", 1), mock.patch.object(QAThrottle, "rate_per_minute", 1):
+            await self.async_client.post(url, {"query": "hi"}, content_type="application/json")
+            response = await self.async_client.post(url, {"query": "hi"}, content_type="application/json")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
@@ -0,0 +1,82 @@
+import json
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from rest_framework.renderers import JSONRenderer
+
+from apis.encoders import coin_encoder, favorite_encoder, history_encoder
+from apis.ingest import upsert_coins
+from apis.models import Coin, FavoriteCoin, HistoricalPrice
+from apis.renderers import ORJSONRenderer
+from apis.serializers import CoinSerializer, FavoriteCoinSerializer, HistoricalPriceSerializer
+
+from .base import RedisTestCase, market
+
+
+@mock.patch("apis.ingest.publish_tick")
+class RowEncoderTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        unpriced = market(1)
+        unpriced.update(current_price=None, total_volume=None, price_change_percentage_24h=None)
+        upsert_coins([market(0, price=Decimal("0.000012345678")), unpriced])
+        self.coins = list(Coin.objects.order_by("id"))
+
+    def test_coin_rows_match_the_serializer(self, publish_tick):
+        encode = coin_encoder()
+        rows = Coin.objects.order_by("id").values(*encode.columns)
+        self.assertEqual([encode(row) for row in rows], CoinSerializer(self.coins, many=True).data)
+
+    def test_coin_field_subset(self, publish_tick):
+        encode = coin_encoder(("id", "last_price"))
+        self.assertEqual(encode.columns, ("id", "last_price"))
+        row = Coin.objects.filter(pk=self.coins[0].pk).values(*encode.columns).get()
+        self.assertEqual(encode(row), {"id": self.coins[0].pk, "last_price": "0.0000123457"})
+
+    def test_history_rows_match_the_serializer(self, publish_tick):
+        HistoricalPrice.objects.create(coin=self.coins[0], date=date(2024, 1, 1), price=Decimal("1.5"))
+        encode = history_encoder()
+        points = HistoricalPrice.objects.all()
+        self.assertEqual(
+            [encode(row) for row in points.values(*encode.columns)],
+            HistoricalPriceSerializer(points, many=True).data,
+        )
+
+    def test_favorite_rows_match_the_serializer_columns(self, publish_tick):
+        user = User.objects.create_user("alice", password="password123")
+        favorite = FavoriteCoin.objects.create(user=user, coin=self.coins[0])
+        encode = favorite_encoder()
+        row = FavoriteCoin.objects.values(*encode.columns).get()
+        expected = FavoriteCoinSerializer(favorite).data
+        self.assertEqual(encode(row), {name: expected[name] for name in encode.columns})
+
+
+@mock.patch("apis.ingest.publish_tick")
+class ORJSONRendererTests(RedisTestCase):
+    def test_output_matches_json_renderer(self, publish_tick):
+        upsert_coins([market(0, price=Decimal("12.5")), market(1)])
+        data = {
+            "coins": CoinSerializer(Coin.objects.order_by("id"), many=True).data,
+            "ratio": 0.25,
+            "text": "line separator é",
+            "day": date(2024, 1, 1),
+            "price": Decimal("1.10"),
+            1: None,
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_floats_parse_back_to_the_same_value(self, publish_tick):
+        values = [-1.2345e-7, 1.23e-05, 1e16, 0.1 + 0.2]
+        self.assertEqual(json.loads(ORJSONRenderer().render(values)), values)
+        self.assertEqual(ORJSONRenderer().render([-1.2345e-7]), b"[-1.2345e-7]")
+        self.assertEqual(JSONRenderer().render([-1.2345e-7]), b"[-1.2345e-07]")
+
+    def test_indent_falls_back_to_json_renderer(self, publish_tick):
+        media_type = "application/json; indent=2"
+        data = {"a": [1, 2]}
+        self.assertEqual(
+            ORJSONRenderer().render(data, media_type, {}),
+            JSONRenderer().render(data, media_type, {}),
+        )
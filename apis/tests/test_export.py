@@ -0,0 +1,64 @@
+import json
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.test import AsyncClient
+from django.urls import reverse
+
+from apis.ingest import upsert_coins
+from apis.models import Coin, HistoricalPrice
+from apis.views import HistoryExportView
+
+from .base import ApiTestCase, market
+
+
+@mock.patch("apis.ingest.publish_tick")
+class HistoryExportTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        upsert_coins([market(0), market(1)])
+        for coin in Coin.objects.all():
+            for day in (1, 2, 3):
+                HistoricalPrice.objects.create(
+                    coin=coin, date=date(2024, 1, day), price=Decimal(f"{coin.market_cap_rank}.5")
+                )
+        self.url = reverse("history-export")
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, [chunk.decode() for chunk in response.streaming_content]
+
+    def test_ndjson(self, publish_tick):
+        response, chunks = self.export()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in "".join(chunks).splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0], {"coin": "coin-0", "date": "2024-01-01", "price": "1.5000000000"})
+        self.assertEqual(rows[-1]["coin"], "coin-1")
+
+    def test_csv_with_filters(self, publish_tick):
+        response, chunks = self.export(fmt="csv", coins="coin-1, nope", start="2024-01-02", end="2024-01-02")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn("attachment", response["Content-Disposition"])
+        self.assertEqual("".join(chunks), "coin,date,price\r\ncoin-1,2024-01-02,2.5000000000\r\n")
+
+    def test_first_line_is_sent_before_the_batch_fills(self, publish_tick):
+        with mock.patch.object(HistoryExportView, "chunk_size", 4):
+            _, chunks = self.export()
+        self.assertEqual([chunk.count("\n") for chunk in chunks], [1, 4, 1])
+
+    def test_bad_params(self, publish_tick):
+        self.assertEqual(self.client.get(self.url, {"fmt": "xml"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"start": "yesterday"}).status_code, 400)
+
+    async def test_asgi_export_streams_from_an_async_iterator(self, publish_tick):
+        response = await AsyncClient().get(
+            self.url, {"fmt": "csv", "coins": "coin-0"}, headers={"Authorization": f"Bearer {self.token}"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        body = "".join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertEqual(body.splitlines()[0], "coin,date,price")
+        self.assertEqual(len(body.splitlines()), 4)
@@ -0,0 +1,150 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework.exceptions import ValidationError
+
+from apis.aggregation import lttb, max_candles, ohlc
+from apis.history_store import to_day
+from apis.ingest import upsert_coins, upsert_history
+from apis.models import Coin, HistoricalPrice
+from apis.views import parse_history_params
+
+from .base import ApiTestCase, daily_points, market
+
+
+@mock.patch("apis.ingest.publish_tick")
+class CachedHistoryTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        upsert_coins([market(0)])
+        self.coin = Coin.objects.get(coingecko_id="coin-0")
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_history(self.coin, daily_points(range(1, 10)))
+        self.url = reverse("coin-history", args=["coin-0"])
+
+    def test_standard_window_has_validators(self, publish_tick):
+        response = self.client.get(self.url, {"days": 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["ETag"])
+        self.assertIn("Last-Modified", response)
+        self.assertIn("no-cache", response["Cache-Control"])
+        body = response.json()
+        self.assertEqual(body["coin"]["coingecko_id"], "coin-0")
+        self.assertEqual(len(body["history"]), 7)
+
+    def test_current_client_gets_304(self, publish_tick):
+        etag = self.client.get(self.url, {"days": 30})["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {"days": 30}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_new_history_changes_the_etag(self, publish_tick):
+        etag = self.client.get(self.url, {"days": 30})["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_history(self.coin, daily_points([0]))
+        response = self.client.get(self.url, {"days": 30}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["history"]), 10)
+
+    def test_market_refresh_changes_the_etag(self, publish_tick):
+        etag = self.client.get(self.url, {"days": 30})["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_coins([market(0, price=5)])
+        response = self.client.get(self.url, {"days": 30}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["coin"]["last_price"], "5.0000000000")
+
+    def test_unknown_coin(self, publish_tick):
+        response = self.client.get(reverse("coin-history", args=["nope"]), {"days": 30})
+        self.assertEqual(response.status_code, 404)
+
+
+class HistoryParamsTests(SimpleTestCase):
+    def test_candles_beyond_max_points_are_rejected(self):
+        with self.assertRaises(ValidationError):
+            parse_history_params({"days": "3650", "resolution": "day"})
+        with self.assertRaises(ValidationError):
+            parse_history_params({"days": "365", "resolution": "day", "max_points": "100"})
+
+    def test_windows_that_fit_are_accepted(self):
+        self.assertEqual(parse_history_params({"days": "3650", "resolution": "week"}), (3650, "week", None))
+        self.assertEqual(
+            parse_history_params({"days": "99", "resolution": "day", "max_points": "100"}), (99, "day", 100)
+        )
+        self.assertEqual(parse_history_params({"days": "abc"}), (30, None, None))
+
+    def test_bad_values(self):
+        with self.assertRaises(ValidationError):
+            parse_history_params({"resolution": "hour"})
+        with self.assertRaises(ValidationError):
+            parse_history_params({"max_points": "lots"})
+
+    def test_max_candles_bounds_every_window(self):
+        for resolution in ("day", "week", "month"):
+            for days in range(1, 100):
+                for end in range(0, 31, 3):
+                    today = date(2024, 1, 1) + timedelta(days=end)
+                    axis = np.arange(to_day(today) - days, to_day(today) + 1)
+                    starts = ohlc(axis, np.ones(len(axis)), resolution)[0]
+                    self.assertLessEqual(len(starts), max_candles(days, resolution), (resolution, days, today))
+
+
+class AggregationTests(SimpleTestCase):
+    def test_ohlc_weeks_start_on_monday(self):
+        # Sunday 2024-01-07 to Wednesday 2024-01-10
+        days = np.arange(to_day(date(2024, 1, 7)), to_day(date(2024, 1, 11)))
+        prices = np.array([5.0, 3.0, 9.0, 4.0])
+        starts, o, h, l, c = ohlc(days, prices, "week")
+        self.assertEqual([str(d) for d in starts], ["2024-01-01", "2024-01-08"])
+        self.assertEqual(prices[o].tolist(), [5.0, 3.0])
+        self.assertEqual(prices[h].tolist(), [5.0, 9.0])
+        self.assertEqual(prices[l].tolist(), [5.0, 3.0])
+        self.assertEqual(prices[c].tolist(), [5.0, 4.0])
+
+    def test_lttb_keeps_endpoints_and_peaks(self):
+        x = np.arange(100, dtype=np.float64)
+        y = np.zeros(100)
+        y[50] = 10.0
+        keep = lttb(x, y, 10)
+        self.assertEqual(len(keep), 10)
+        self.assertEqual((keep[0], keep[-1]), (0, 99))
+        self.assertIn(50, keep)
+        self.assertTrue(np.all(np.diff(keep) > 0))
+        self.assertEqual(len(lttb(x, y, 500)), 100)
+
+
+@mock.patch("apis.ingest.publish_tick")
+class AggregatedHistoryViewTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        upsert_coins([market(0)])
+        self.coin = Coin.objects.get(coingecko_id="coin-0")
+        self.url = reverse("coin-history", args=["coin-0"])
+
+    def test_prices_match_the_stored_decimals(self, publish_tick):
+        prices = ["12345678.1000000000", "0.0000012345", "65000.1234567891"]
+        for offset, price in enumerate(prices):
+            HistoricalPrice.objects.create(
+                coin=self.coin, date=date.today() - timedelta(days=offset), price=Decimal(price)
+            )
+        history = self.client.get(self.url, {"days": 10, "resolution": "day"}).json()["history"]
+        self.assertEqual([candle["close"] for candle in history], prices[::-1])
+        history = self.client.get(self.url, {"days": 10, "max_points": 100}).json()["history"]
+        self.assertEqual([row["price"] for row in history], prices[::-1])
+
+    def test_downsampled_to_max_points(self, publish_tick):
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_history(self.coin, daily_points(range(0, 200)))
+        response = self.client.get(self.url, {"days": 200, "max_points": 50})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["history"]), 50)
+
+    def test_window_too_long_for_the_resolution(self, publish_tick):
+        response = self.client.get(self.url, {"days": 3650, "resolution": "day"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("days", response.json())
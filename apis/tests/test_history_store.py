@@ -0,0 +1,78 @@
+import os
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+import numpy as np
+
+from apis import history_store
+from apis.ingest import upsert_coins, upsert_history
+from apis.models import Coin, HistoricalPrice
+
+from .base import RedisTestCase, daily_points, market
+
+
+@mock.patch("apis.ingest.publish_tick")
+class HistoryStoreTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        upsert_coins([market(0)])
+        self.coin = Coin.objects.get(coingecko_id="coin-0")
+
+    def test_series_is_built_from_the_db_on_first_use(self, publish_tick):
+        HistoricalPrice.objects.create(coin=self.coin, date=date(2024, 1, 2), price=Decimal("3"))
+        HistoricalPrice.objects.create(coin=self.coin, date=date(2024, 1, 1), price=Decimal("2"))
+        days, prices = history_store.load_series(self.coin.pk)
+        self.assertEqual([history_store.from_day(d) for d in days], [date(2024, 1, 1), date(2024, 1, 2)])
+        self.assertEqual(prices.tolist(), [2.0, 3.0])
+
+    def test_reopens_after_ingest_rewrites_the_files(self, publish_tick):
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_history(self.coin, daily_points([2, 3]))
+        days, _ = history_store.load_series(self.coin.pk)
+        self.assertEqual(len(days), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_history(self.coin, daily_points([0, 1]))
+        days, _ = history_store.load_series(self.coin.pk)
+        self.assertEqual(len(days), 4)
+        self.assertEqual(history_store.from_day(days[-1]), date.today())
+
+    def test_reopens_when_another_process_rewrote_the_files(self, publish_tick):
+        history_store.load_series(self.coin.pk)
+        HistoricalPrice.objects.create(coin=self.coin, date=date(2024, 1, 1), price=Decimal("2"))
+        # A rewrite by another process only changes the file, not our cache
+        cached = history_store._loaded[self.coin.pk]
+        history_store.write_series(self.coin.pk)
+        history_store._loaded[self.coin.pk] = (cached[0] - 1, *cached[1:])
+        days, _ = history_store.load_series(self.coin.pk)
+        self.assertEqual(len(days), 1)
+
+    def test_loaded_series_hold_no_file_descriptors(self, publish_tick):
+        if not os.path.isdir("/proc/self/fd"):
+            self.skipTest("needs /proc/self/fd")
+        upsert_coins([market(i) for i in range(1, 50)])
+        before = len(os.listdir("/proc/self/fd"))
+        for coin_id in Coin.objects.values_list("id", flat=True):
+            history_store.load_series(coin_id)
+        self.assertLessEqual(len(os.listdir("/proc/self/fd")), before)
+
+    @mock.patch.object(history_store, "MAX_LOADED_COINS", 3)
+    def test_least_recently_used_series_are_evicted(self, publish_tick):
+        upsert_coins([market(i) for i in range(1, 4)])
+        ids = list(Coin.objects.order_by("id").values_list("id", flat=True))
+        for coin_id in ids[:3]:
+            history_store.load_series(coin_id)
+        history_store.load_series(ids[0])
+        history_store.load_series(ids[3])
+        self.assertEqual(list(history_store._loaded), [ids[2], ids[0], ids[3]])
+
+    def test_price_matrix_aligns_coins_on_days(self, publish_tick):
+        upsert_coins([market(1)])
+        other = Coin.objects.get(coingecko_id="coin-1")
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_history(self.coin, daily_points([0, 2]))
+            upsert_history(other, daily_points([1]))
+        axis, matrix = history_store.price_matrix([self.coin.pk, other.pk], 2)
+        self.assertEqual(history_store.from_day(axis[-1]), date.today())
+        np.testing.assert_array_equal(matrix, [[12.0, np.nan, 10.0], [np.nan, 11.0, np.nan]])
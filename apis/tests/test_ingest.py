@@ -0,0 +1,116 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from apis.cache import market_version
+from apis.ingest import plan_history_sync, upsert_coins, upsert_history
+from apis.models import Coin, HistoricalPrice
+
+from .base import RedisTestCase, daily_points, market
+
+
+@mock.patch("apis.ingest.publish_tick")
+class UpsertHistoryTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        upsert_coins([market(0)])
+        self.coin = Coin.objects.get(coingecko_id="coin-0")
+
+    def test_counts_inserts_and_updates(self, publish_tick):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(upsert_history(self.coin, daily_points(range(3, 6))), (3, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(upsert_history(self.coin, daily_points(range(0, 5), price=20)), (3, 2))
+
+        self.assertEqual(HistoricalPrice.objects.filter(coin=self.coin).count(), 6)
+        overwritten = HistoricalPrice.objects.get(coin=self.coin, date=date.today() - timedelta(days=4))
+        self.assertEqual(overwritten.price, Decimal("24"))
+
+    def test_collapses_points_per_day(self, publish_tick):
+        noon = daily_points([1])[0][0]
+        evening = noon + 6 * 3600 * 1000
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(upsert_history(self.coin, [[noon, 1], [evening, 2], [evening, None]]), (1, 0))
+        self.assertEqual(HistoricalPrice.objects.get(coin=self.coin).price, Decimal("2"))
+
+    def test_no_points_writes_nothing(self, publish_tick):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertEqual(upsert_history(self.coin, []), (0, 0))
+        self.assertEqual(callbacks, [])
+        self.assertFalse(HistoricalPrice.objects.exists())
+
+
+@mock.patch("apis.ingest.publish_tick")
+class UpsertCoinsTests(RedisTestCase):
+    def test_reports_only_new_coins(self, publish_tick):
+        self.assertEqual(upsert_coins([market(0), market(1)]), ["coin-0", "coin-1"])
+        self.assertEqual(upsert_coins([market(1, price=5), market(2)]), ["coin-2"])
+
+        self.assertEqual(Coin.objects.count(), 3)
+        coin = Coin.objects.get(coingecko_id="coin-1")
+        self.assertEqual(coin.last_price, Decimal("5"))
+        self.assertEqual(coin.symbol, "C1")
+
+    def test_duplicate_ids_in_one_payload_are_written_once(self, publish_tick):
+        self.assertEqual(upsert_coins([market(0), market(0, price=7)]), ["coin-0"])
+        self.assertEqual(Coin.objects.get().last_price, Decimal("7"))
+
+    def test_commit_bumps_the_market_version_and_publishes(self, publish_tick):
+        version = market_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_coins([market(0)])
+        self.assertNotEqual(market_version(), version)
+        publish_tick.assert_called_once()
+        self.assertEqual([c.coingecko_id for c in publish_tick.call_args.args[0]], ["coin-0"])
+
+    def test_empty_payload(self, publish_tick):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertEqual(upsert_coins([]), [])
+        self.assertEqual(callbacks, [])
+
+
+@mock.patch("apis.ingest.publish_tick")
+class PlanHistorySyncTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        upsert_coins([market(i) for i in range(5)])
+        self.coins = {coin.coingecko_id: coin for coin in Coin.objects.all()}
+
+    def store(self, coingecko_id, days_ago, days=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_history(self.coins[coingecko_id], daily_points(days_ago), days=days)
+
+    def test_plan(self, publish_tick):
+        self.store("coin-0", range(0, 31))
+        self.store("coin-1", [0, 1, 5, 6, 30])
+        self.store("coin-2", range(0, 10))
+        self.store("coin-4", range(3, 31))
+
+        plan = plan_history_sync(30)
+        self.assertEqual(plan["coin-0"], 1)   # complete: only today again
+        self.assertEqual(plan["coin-1"], 30)  # hole in the middle
+        self.assertEqual(plan["coin-2"], 30)  # leading gap
+        self.assertEqual(plan["coin-3"], 30)  # no history
+        self.assertEqual(plan["coin-4"], 4)   # missing the last three days
+
+    def test_coin_younger_than_the_window_is_not_backfilled_again(self, publish_tick):
+        # A full 30-day fetch only returned 10 days: the coin was listed then
+        self.store("coin-0", range(0, 10), days=30)
+        self.assertEqual(Coin.objects.get(coingecko_id="coin-0").history_start, date.today() - timedelta(days=9))
+        self.assertEqual(plan_history_sync(30, coin_ids=["coin-0"]), {"coin-0": 1})
+
+        # A hole after the listing date still triggers the full window
+        HistoricalPrice.objects.filter(date=date.today() - timedelta(days=5)).delete()
+        self.assertEqual(plan_history_sync(30, coin_ids=["coin-0"]), {"coin-0": 30})
+
+    def test_history_start_only_moves_earlier(self, publish_tick):
+        self.store("coin-0", range(0, 10), days=30)
+        self.store("coin-0", range(0, 2), days=30)
+        self.assertEqual(Coin.objects.get(coingecko_id="coin-0").history_start, date.today() - timedelta(days=9))
+        self.store("coin-0", range(0, 31), days=30)
+        self.assertEqual(Coin.objects.get(coingecko_id="coin-0").history_start, date.today() - timedelta(days=9))
+
+    def test_full_window_response_records_nothing(self, publish_tick):
+        self.store("coin-0", range(0, 31), days=30)
+        self.store("coin-1", range(0, 2), days=1)
+        self.assertFalse(Coin.objects.filter(history_start__isnull=False).exists())
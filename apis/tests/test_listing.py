@@ -0,0 +1,140 @@
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.utils import timezone
+from django.urls import reverse
+
+from apis.ingest import upsert_coins
+from apis.models import Coin
+from apis.pagination import encode_cursor
+
+from .base import ApiTestCase, market
+
+
+@mock.patch("apis.ingest.publish_tick")
+class TopCoinsCacheTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        upsert_coins([market(i) for i in range(3)])
+        self.url = reverse("top-coins")
+
+    def test_pages_are_served_from_cache(self, publish_tick):
+        self.client.get(self.url, {"n": 3})
+        # Only the JWT user lookup is left
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {"n": 3})
+        self.assertEqual([c["coingecko_id"] for c in response.json()], ["coin-0", "coin-1", "coin-2"])
+
+    def test_market_refresh_invalidates_pages(self, publish_tick):
+        self.assertEqual(self.client.get(self.url, {"n": 3}).json()[1]["last_price"], "1.0000000000")
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_coins([market(1, price=42)])
+        self.assertEqual(self.client.get(self.url, {"n": 3}).json()[1]["last_price"], "42.0000000000")
+
+    def test_is_favorite_is_per_user(self, publish_tick):
+        self.client.post(reverse("favorite-coin-list-create"), {"coin": Coin.objects.get(coingecko_id="coin-2").pk})
+        rows = self.client.get(self.url, {"n": 3}).json()
+        self.assertEqual([row["is_favorite"] for row in rows], [False, False, True])
+
+        # Same cached page, another user's favorites
+        other = self.client_for("bob")
+        self.assertEqual([row["is_favorite"] for row in other.get(self.url, {"n": 3}).json()], [False] * 3)
+
+    def test_requires_authentication(self, publish_tick):
+        self.client.credentials()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+@mock.patch("apis.ingest.publish_tick")
+class TopCoinsPaginationTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        markets = [market(i) for i in range(5)]
+        markets[1]["market_cap_rank"] = None
+        markets[3]["market_cap_rank"] = 1
+        upsert_coins(markets)
+        self.url = reverse("top-coins")
+
+    def walk(self, **params):
+        """Follow the Link headers from the first page, returning every page."""
+        pages, url = [], f"{self.url}?{urlencode(params)}"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json())
+            link = response.get("Link")
+            url = link[1:link.index(">")] if link else None
+        return pages
+
+    def test_cursor_walks_every_coin_once_unranked_last(self, publish_tick):
+        pages = self.walk(n=2)
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(
+            [row["coingecko_id"] for page in pages for row in page],
+            ["coin-0", "coin-3", "coin-2", "coin-4", "coin-1"],
+        )
+
+    def test_fields_select_a_subset_in_serializer_order(self, publish_tick):
+        pages = self.walk(n=3, fields="name,id")
+        self.assertEqual([list(row) for page in pages for row in page], [["id", "name"]] * 5)
+        # Pages after the first keep the selection through the cursor link
+        self.assertEqual(len(pages), 2)
+
+    def test_only_the_first_page_is_cached(self, publish_tick):
+        def cached_pages():
+            return [key for key in cache._cache if ":topcoins:" in key]
+
+        self.client.get(self.url, {"n": 2})
+        self.client.get(self.url, {"n": 2, "fields": "id"})
+        self.client.get(self.url, {"n": 2, "fields": "id,name"})
+        self.walk(n=1)
+        self.assertEqual(len(cached_pages()), 2)
+
+    def test_bad_params(self, publish_tick):
+        self.assertEqual(self.client.get(self.url, {"cursor": "not-a-cursor"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"cursor": encode_cursor(["x", 1])}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"fields": "id,price"}).status_code, 400)
+        self.assertEqual(len(self.client.get(self.url, {"n": 1000}).json()), 5)
+
+
+@mock.patch("apis.ingest.publish_tick")
+@mock.patch("apis.tasks.fetch_coins_by_ids.apply_async")
+class StaleWhileRevalidateTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        # coin-0 is hot by rank, coin-1 warm, coin-2 unranked and so cold
+        markets = [market(0), market(1), market(2)]
+        markets[1]["market_cap_rank"] = 100
+        markets[2]["market_cap_rank"] = None
+        upsert_coins(markets)
+
+    def age(self, minutes_by_coin):
+        for coingecko_id, minutes in minutes_by_coin.items():
+            Coin.objects.filter(coingecko_id=coingecko_id).update(
+                updated_at=timezone.now() - timedelta(minutes=minutes)
+            )
+        cache.clear()
+
+    def test_coins_behind_their_tier_schedule_are_refreshed(self, apply_async, publish_tick):
+        self.age({"coin-0": 5, "coin-1": 10, "coin-2": 70})
+        response = self.client.get(reverse("top-coins"), {"n": 3})
+        self.assertGreaterEqual(int(response["X-Data-Age"]), 70 * 60)
+        apply_async.assert_called_once_with((["coin-0", "coin-2"],), countdown=0)
+
+        # Already queued: further reads don't queue it again
+        self.client.get(reverse("top-coins"), {"n": 3})
+        apply_async.assert_called_once()
+
+    def test_fresh_within_grace(self, apply_async, publish_tick):
+        self.age({"coin-0": 2, "coin-1": 16, "coin-2": 62})
+        response = self.client.get(reverse("top-coins"), {"n": 3})
+        self.assertLess(int(response["X-Data-Age"]), 63 * 60)
+        apply_async.assert_not_called()
+
+    def test_history_reads_use_the_coin_tier(self, apply_async, publish_tick):
+        self.age({"coin-1": 20})
+        response = self.client.get(reverse("coin-history", args=["coin-1"]))
+        self.assertGreaterEqual(int(response["X-Data-Age"]), 20 * 60)
+        apply_async.assert_called_once_with((["coin-1"],), countdown=0)
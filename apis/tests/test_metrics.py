@@ -0,0 +1,39 @@
+from unittest import mock
+
+from django.test import override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from apis.ingest import upsert_coins
+
+from .base import ApiTestCase, market
+
+
+@mock.patch("apis.ingest.publish_tick")
+class MetricsViewTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("metrics")
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_not_served_without_a_token(self, publish_tick):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_requires_the_token(self, publish_tick):
+        self.client.credentials()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+        response = self.client.get(self.url, HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"http_requests_total", response.content)
+
+    def test_requests_are_counted_per_url_name(self, publish_tick):
+        upsert_coins([market(0)])
+        labels = {"method": "GET", "endpoint": "top-coins", "status": "200"}
+        before = REGISTRY.get_sample_value("http_requests_total", labels) or 0
+        self.assertEqual(self.client.get(reverse("top-coins")).status_code, 200)
+        self.assertEqual(REGISTRY.get_sample_value("http_requests_total", labels), before + 1)
+        self.assertIsNotNone(
+            REGISTRY.get_sample_value("http_request_db_queries_count", {"endpoint": "top-coins"})
+        )
@@ -0,0 +1,116 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from apis.ingest import upsert_coins
+from apis.qa import CoinEntry, CoinIndex, get_coin_index, handle_query, resolve_coin
+from apis.throttling import QAThrottle
+
+from .base import RedisTestCase, market
+
+
+def entry(pk, coingecko_id, name, symbol, rank):
+    return CoinEntry(pk, coingecko_id, name, symbol, rank, Decimal("1"))
+
+
+class CoinIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = CoinIndex([
+            entry(1, "bitcoin", "Bitcoin", "BTC", 1),
+            entry(2, "ethereum", "Ethereum", "ETH", 2),
+            entry(3, "tether", "Tether", "USDT", 3),
+            entry(4, "bitcoin-cash", "Bitcoin Cash", "BCH", 20),
+            entry(5, "fake-bitcoin", "Fake", "BTC", 900),
+            entry(6, "the-coin", "The Coin", "THE", 500),
+        ])
+
+    def lookup(self, text):
+        coin = self.index.lookup(text)
+        return coin.coingecko_id if coin else None
+
+    def test_whole_tokens_only(self):
+        self.assertEqual(self.lookup("price of eth"), "ethereum")
+        self.assertEqual(self.lookup("price of tether"), "tether")
+        self.assertIsNone(self.lookup("price of ethx"))
+
+    def test_longest_phrase_wins(self):
+        self.assertEqual(self.lookup("price of bitcoin cash"), "bitcoin-cash")
+        self.assertEqual(self.lookup("price of bitcoin"), "bitcoin")
+
+    def test_best_rank_wins_a_shared_symbol(self):
+        self.assertEqual(self.lookup("how much is BTC worth?"), "bitcoin")
+
+    def test_aliases_and_ids(self):
+        self.assertEqual(self.lookup("price of xbt"), "bitcoin")
+        self.assertEqual(self.lookup("price of ether"), "ethereum")
+        self.assertEqual(self.lookup("price of fake bitcoin"), "fake-bitcoin")
+
+    def test_template_words_never_match_a_symbol(self):
+        self.assertIsNone(self.lookup("what is the price"))
+        self.assertEqual(self.lookup("price of the coin"), "the-coin")
+
+
+@mock.patch("apis.ingest.publish_tick")
+class CoinIndexRefreshTests(RedisTestCase):
+    def test_rebuilt_after_a_market_refresh(self, publish_tick):
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_coins([market(0)])
+        index = get_coin_index()
+        self.assertIs(get_coin_index(), index)
+        self.assertIsNone(resolve_coin("price of c1"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_coins([market(1)])
+        self.assertIsNot(get_coin_index(), index)
+        self.assertEqual(resolve_coin("price of c1").coingecko_id, "coin-1")
+
+
+@mock.patch("apis.ingest.publish_tick")
+@mock.patch.object(QAThrottle, "burst", 2)
+@mock.patch.object(QAThrottle, "rate_per_minute", 1)
+class QAViewTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        upsert_coins([market(0)])
+        self.url = reverse("qa")
+
+    def ask(self, query="price of coin 0", ip="10.0.0.1", **headers):
+        return self.client.post(
+            self.url, {"query": query}, content_type="application/json", REMOTE_ADDR=ip, **headers
+        )
+
+    def test_throttled_per_client_ip(self, publish_tick):
+        self.assertEqual(self.ask().status_code, 200)
+        self.assertEqual(self.ask().status_code, 200)
+        response = self.ask()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response["Retry-After"]), 0)
+        self.assertEqual(self.ask(ip="10.0.0.2").status_code, 200)
+
+    def test_forwarded_for_is_ignored_without_proxies(self, publish_tick):
+        for i in range(2):
+            self.ask(HTTP_X_FORWARDED_FOR=f"1.2.3.{i}")
+        self.assertEqual(self.ask(HTTP_X_FORWARDED_FOR="1.2.3.9").status_code, 429)
+
+    def test_forwarded_for_from_trusted_proxy(self, publish_tick):
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}):
+            for i in range(2):
+                self.ask(HTTP_X_FORWARDED_FOR=f"1.2.3.{i}")
+            self.assertEqual(self.ask(HTTP_X_FORWARDED_FOR="1.2.3.9").status_code, 200)
+            self.assertEqual(self.ask(HTTP_X_FORWARDED_FOR="6.6.6.6, 1.2.3.9").status_code, 200)
+            self.assertEqual(self.ask(HTTP_X_FORWARDED_FOR="7.7.7.7, 1.2.3.9").status_code, 429)
+
+    def test_answers_are_cached_per_normalized_query(self, publish_tick):
+        with mock.patch("apis.views.handle_query", wraps=handle_query) as handler:
+            first = self.ask("Price of  Coin 0").json()
+            second = self.ask("price of coin 0 ", ip="10.0.0.2").json()
+        self.assertEqual(first, second)
+        self.assertEqual(first["coin"], "coin-0")
+        handler.assert_called_once_with("price of coin 0")
+
+    def test_missing_query(self, publish_tick):
+        response = self.client.post(self.url, {}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,51 @@
+from unittest import mock
+
+from apis.ratelimit import TokenBucket, parse_retry_after
+
+from .base import RedisTestCase
+
+
+class TokenBucketTests(RedisTestCase):
+    def test_reserve_books_consecutive_slots_after_burst(self):
+        bucket = TokenBucket("test", rate_per_minute=60, burst=2)
+        with mock.patch.object(TokenBucket, "_now_ms", return_value=1_000_000):
+            delays = [bucket.reserve() for _ in range(4)]
+        self.assertEqual(delays, [0.0, 0.0, 1.0, 2.0])
+
+    def test_buckets_are_shared_by_name(self):
+        with mock.patch.object(TokenBucket, "_now_ms", return_value=1_000_000):
+            TokenBucket("test", rate_per_minute=60).reserve()
+            self.assertEqual(TokenBucket("test", rate_per_minute=60).reserve(), 1.0)
+            self.assertEqual(TokenBucket("other", rate_per_minute=60).reserve(), 0.0)
+
+    def test_penalize_pushes_reservations_past_cooldown(self):
+        bucket = TokenBucket("test", rate_per_minute=60, burst=5)
+        with mock.patch.object(TokenBucket, "_now_ms", return_value=1_000_000):
+            self.assertEqual(bucket.penalize(30), 30.0)
+            self.assertEqual(bucket.cooldown_remaining(), 30.0)
+            self.assertEqual(bucket.reserve(), 30.0)
+            # A shorter penalty never shortens the running cooldown
+            self.assertEqual(bucket.penalize(5), 30.0)
+
+    def test_penalize_zero_is_a_no_op(self):
+        bucket = TokenBucket("test", rate_per_minute=60)
+        self.assertEqual(parse_retry_after("0"), 0)
+        self.assertEqual(bucket.penalize(parse_retry_after("0")), 0.0)
+        self.assertEqual(bucket.penalize(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT")), 0.0)
+        self.assertEqual(bucket.cooldown_remaining(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+
+    def test_try_acquire_does_not_book_when_empty(self):
+        bucket = TokenBucket("test", rate_per_minute=60, burst=1)
+        with mock.patch.object(TokenBucket, "_now_ms", return_value=1_000_000):
+            self.assertEqual(bucket.try_acquire(), 0)
+            self.assertEqual(bucket.try_acquire(), 1.0)
+            self.assertEqual(bucket.try_acquire(), 1.0)
+        with mock.patch.object(TokenBucket, "_now_ms", return_value=1_001_000):
+            self.assertEqual(bucket.try_acquire(), 0)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("12"), 12)
+        self.assertEqual(parse_retry_after("-5"), 0)
+        self.assertEqual(parse_retry_after(None), 60)
+        self.assertEqual(parse_retry_after("soon"), 60)
@@ -0,0 +1,99 @@
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.test import AsyncClient
+from django.urls import reverse
+
+from apis import streams
+from apis.cache import refresh_favorites
+from apis.ingest import upsert_coins
+from apis.models import Coin, FavoriteCoin
+
+from .base import ApiTestCase, market
+
+
+async def _no_subscription(hub):
+    """Stands in for TickHub._run; ticks are fed with _fan_out."""
+
+
+@mock.patch("apis.ingest.publish_tick")
+class PublishTickTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(streams.TICK_CHANNEL)
+        self.addCleanup(self.pubsub.close)
+
+    def published(self):
+        messages = [self.pubsub.get_message() for _ in range(10)]
+        return [json.loads(message["data"]) for message in messages if message is not None]
+
+    def test_only_moved_coins_are_published(self, publish_tick):
+        upsert_coins([market(0), market(1)])
+        coins = list(Coin.objects.order_by("id"))
+        self.assertEqual(streams.publish_tick(coins), 2)
+        self.assertEqual(streams.publish_tick(coins), 0)
+
+        coins[1].last_price = Decimal("5")
+        self.assertEqual(streams.publish_tick(coins), 1)
+        first, second = self.published()
+        self.assertEqual([row[1] for row in first["c"]], ["coin-0", "coin-1"])
+        self.assertEqual(second["c"], [[coins[1].pk, "coin-1", "5", 1.5]])
+
+
+@mock.patch.object(streams.TickHub, "_run", _no_subscription)
+class PriceStreamTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(streams, "hub", streams.TickHub())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        upsert_coins([market(0), market(1)])
+        self.coins = list(Coin.objects.order_by("id"))
+        self.url = reverse("price-stream")
+
+    def test_wsgi_is_refused(self):
+        response = self.client.get(self.url, {"token": self.token})
+        self.assertEqual(response.status_code, 501)
+
+    async def test_requires_authentication(self):
+        client = AsyncClient()
+        self.assertEqual((await client.get(self.url)).status_code, 401)
+        self.assertEqual((await client.get(self.url, {"token": "nope"})).status_code, 401)
+        self.assertEqual((await client.get(self.url, {"favorites": "1"})).status_code, 401)
+
+    async def test_streams_ticks(self):
+        response = await AsyncClient().get(self.url, {"token": self.token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = aiter(response.streaming_content)
+        self.assertEqual(await anext(events), b"retry: 5000\n\n")
+
+        tick = {"v": 1, "ts": 0, "c": [[self.coins[0].pk, "coin-0", "2", 1.5]]}
+        streams.hub._fan_out(json.dumps(tick))
+        self.assertEqual(await anext(events), f"event: tick\ndata: {json.dumps(tick)}\n\n".encode())
+
+    async def test_disconnected_clients_unsubscribe(self):
+        events = streams._events()
+        await anext(events)
+        self.assertEqual(len(streams.hub.queues), 1)
+        await events.aclose()
+        self.assertEqual(streams.hub.queues, set())
+
+    async def test_favorites_feed_only_sends_favorites(self):
+        await FavoriteCoin.objects.acreate(user=self.user, coin=self.coins[1])
+        await streams.sync_to_async(refresh_favorites)(self.user.id)
+        response = await AsyncClient().get(
+            self.url, {"favorites": "1"}, headers={"Authorization": f"Bearer {self.token}"}
+        )
+        events = aiter(response.streaming_content)
+        await anext(events)
+
+        streams.hub._fan_out(json.dumps({"v": 1, "ts": 0, "c": [[self.coins[0].pk, "coin-0", "2", 1.5]]}))
+        streams.hub._fan_out(json.dumps({"v": 2, "ts": 0, "c": [
+            [self.coins[0].pk, "coin-0", "3", 1.5], [self.coins[1].pk, "coin-1", "4", 1.5],
+        ]}))
+        data = json.loads((await anext(events)).decode().split("data: ", 1)[1])
+        self.assertEqual(data["v"], 2)
+        self.assertEqual([row[1] for row in data["c"]], ["coin-1"])
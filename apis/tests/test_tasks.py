@@ -0,0 +1,65 @@
+from unittest import mock
+
+from celery.exceptions import Retry
+
+from apis import tasks
+from apis.models import Coin
+
+from .base import RedisTestCase, market
+
+
+def markets_response(markets):
+    return mock.Mock(status_code=200, **{"json.return_value": markets})
+
+
+@mock.patch("apis.ingest.publish_tick")
+@mock.patch.object(tasks.fetch_all_coins_history, "delay")
+@mock.patch.object(tasks.fetch_markets_page, "apply_async")
+@mock.patch.object(tasks, "coingecko_limiter")
+class FetchTopCoinsTests(RedisTestCase):
+    def test_free_slot_fetches_page_one_inline(self, limiter, apply_async, backfill, publish_tick):
+        limiter.cooldown_remaining.return_value = 0
+        limiter.reserve.side_effect = [0, 4]
+        with mock.patch("apis.coingecko.markets", return_value=markets_response([market(0)])) as markets:
+            tasks.fetch_top_coins.apply(kwargs={"n": tasks.MARKETS_MAX_PER_PAGE + 5}).get()
+        markets.assert_called_once_with(per_page=tasks.MARKETS_MAX_PER_PAGE, page=1, ids=None)
+        self.assertTrue(Coin.objects.filter(coingecko_id="coin-0").exists())
+        apply_async.assert_called_once_with((2, tasks.MARKETS_MAX_PER_PAGE, 5), countdown=4)
+
+    def test_busy_bucket_queues_page_one_for_its_slot(self, limiter, apply_async, backfill, publish_tick):
+        limiter.cooldown_remaining.return_value = 0
+        limiter.reserve.return_value = 7
+        with mock.patch("apis.coingecko.markets") as markets:
+            tasks.fetch_top_coins.apply(kwargs={"n": 10}).get()
+        markets.assert_not_called()
+        apply_async.assert_called_once_with((1, 10), countdown=7)
+
+    def test_cooldown_retries_without_booking(self, limiter, apply_async, backfill, publish_tick):
+        limiter.cooldown_remaining.return_value = 30
+        with mock.patch("apis.coingecko.markets") as markets, \
+                mock.patch.object(tasks.fetch_top_coins, "retry", return_value=Retry()) as retry:
+            tasks.fetch_top_coins.apply(kwargs={"n": 10})
+        retry.assert_called_once_with(countdown=30)
+        limiter.reserve.assert_not_called()
+        markets.assert_not_called()
+
+
+@mock.patch.object(tasks.fetch_coins_by_ids, "apply_async")
+@mock.patch.object(tasks, "coingecko_limiter")
+class RefreshTierTests(RedisTestCase):
+    def test_each_batch_is_queued_for_its_slot(self, limiter, apply_async):
+        ids = [f"coin-{i}" for i in range(tasks.MARKETS_MAX_PER_PAGE + 1)]
+        limiter.cooldown_remaining.return_value = 0
+        limiter.reserve.side_effect = [0, 3]
+        with mock.patch.object(tasks.tiers, "assign_tiers", return_value={"hot": ids}):
+            self.assertEqual(tasks.refresh_tier("hot"), len(ids))
+        self.assertEqual(apply_async.call_args_list, [
+            mock.call(args=[ids[:-1]], countdown=0),
+            mock.call(args=[ids[-1:]], countdown=3),
+        ])
+
+    def test_skipped_during_cooldown(self, limiter, apply_async):
+        limiter.cooldown_remaining.return_value = 30
+        self.assertIsNone(tasks.refresh_tier("hot"))
+        limiter.reserve.assert_not_called()
+        apply_async.assert_not_called()
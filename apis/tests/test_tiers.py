@@ -0,0 +1,50 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase
+
+from apis import tiers
+from apis.ingest import upsert_coins
+from apis.models import Coin, FavoriteCoin
+
+from .base import RedisTestCase, market
+
+
+class TierForTests(SimpleTestCase):
+    def test_rank_favorites_and_views(self):
+        self.assertEqual(tiers.tier_for(tiers.HOT_RANK, 0, 0), "hot")
+        self.assertEqual(tiers.tier_for(tiers.HOT_RANK + 1, 0, 0), "warm")
+        self.assertEqual(tiers.tier_for(tiers.WARM_RANK + 1, 0, 0), "cold")
+        self.assertEqual(tiers.tier_for(None, 0, 0), "cold")
+        self.assertEqual(tiers.tier_for(None, 1, 0), "hot")
+        self.assertEqual(tiers.tier_for(None, 0, tiers.WARM_VIEWS), "warm")
+        self.assertEqual(tiers.tier_for(None, 0, tiers.HOT_VIEWS), "hot")
+
+
+@mock.patch("apis.ingest.publish_tick")
+class AssignTiersTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        ranks = {"coin-0": 1, "coin-1": tiers.HOT_RANK + 1, "coin-2": None, "coin-3": None, "coin-4": None}
+        markets = [market(i) for i in range(5)]
+        for m in markets:
+            m["market_cap_rank"] = ranks[m["id"]]
+        upsert_coins(markets)
+
+    def test_assignment(self, publish_tick):
+        user = User.objects.create_user("alice", password="password123")
+        FavoriteCoin.objects.create(user=user, coin=Coin.objects.get(coingecko_id="coin-2"))
+        tiers.record_view("coin-3")
+        self.assertEqual(
+            {tier: sorted(ids) for tier, ids in tiers.assign_tiers().items()},
+            {"hot": ["coin-0", "coin-2"], "warm": ["coin-1", "coin-3"], "cold": ["coin-4"]},
+        )
+
+    def test_views_are_summed_over_the_window(self, publish_tick):
+        for _ in range(tiers.HOT_VIEWS - 1):
+            tiers.record_view("coin-4")
+        with mock.patch("time.time", return_value=tiers.time.time() - 3600):
+            tiers.record_view("coin-4")
+        self.assertEqual(tiers.recent_views(), {"coin-4": tiers.HOT_VIEWS})
+        self.assertIn("coin-4", tiers.assign_tiers()["hot"])
+        self.assertEqual(tiers.recent_views(hours=1), {"coin-4": tiers.HOT_VIEWS - 1})
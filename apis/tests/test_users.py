@@ -0,0 +1,97 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from apis.ingest import upsert_coins, upsert_history
+from apis.models import Coin, FavoriteCoin
+from apis.serializers import FavoriteCoinSerializer
+
+from .base import ApiTestCase, daily_points, market
+
+
+@mock.patch("apis.ingest.publish_tick")
+class FavoritesTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        upsert_coins([market(i) for i in range(3)])
+        self.coins = {coin.coingecko_id: coin for coin in Coin.objects.all()}
+        self.url = reverse("favorite-coin-list-create")
+
+    def favorite(self, coingecko_id, client=None):
+        return (client or self.client).post(self.url, {"coin": self.coins[coingecko_id].pk})
+
+    def test_list_matches_the_serializer(self, publish_tick):
+        self.favorite("coin-2")
+        self.favorite("coin-0")
+        expected = FavoriteCoinSerializer(
+            FavoriteCoin.objects.filter(user=self.user).order_by("id"), many=True
+        ).data
+        self.assertEqual(self.client.get(self.url).json(), expected)
+        self.assertEqual([row["coin_name"] for row in expected], ["Coin 2", "Coin 0"])
+
+    def test_warm_list_needs_no_queries_beyond_auth(self, publish_tick):
+        self.favorite("coin-1")
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.client.get(self.url).json()), 1)
+
+    def test_adding_and_removing_update_the_cached_list(self, publish_tick):
+        self.assertEqual(self.client.get(self.url).json(), [])
+        self.assertEqual(self.favorite("coin-1").status_code, 201)
+        self.assertEqual([row["coin"] for row in self.client.get(self.url).json()], [self.coins["coin-1"].pk])
+
+        response = self.client.delete(reverse("favorite-coin-delete", args=[self.coins["coin-1"].pk]))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(self.url).json(), [])
+
+    def test_duplicate_is_rejected(self, publish_tick):
+        self.favorite("coin-0")
+        self.assertEqual(self.favorite("coin-0").status_code, 400)
+        self.assertEqual(FavoriteCoin.objects.count(), 1)
+
+    def test_favorites_are_per_user(self, publish_tick):
+        other = self.client_for("bob")
+        self.favorite("coin-0")
+        self.favorite("coin-1", client=other)
+        self.assertEqual([row["coin"] for row in other.get(self.url).json()], [self.coins["coin-1"].pk])
+
+
+@mock.patch("apis.ingest.publish_tick")
+class WatchlistTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        upsert_coins([market(i) for i in range(3)])
+        self.coins = {coin.coingecko_id: coin for coin in Coin.objects.all()}
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_history(self.coins["coin-1"], daily_points(range(10)))
+        for coingecko_id in ("coin-1", "coin-0"):
+            self.client.post(reverse("favorite-coin-list-create"), {"coin": self.coins[coingecko_id].pk})
+        self.url = reverse("watchlist")
+
+    def test_rows_and_sparklines(self, publish_tick):
+        rows = self.client.get(self.url).json()
+        self.assertEqual([row["coingecko_id"] for row in rows], ["coin-1", "coin-0"])
+        self.assertTrue(all(row["is_favorite"] and row["favorited_at"] for row in rows))
+        sparkline = rows[0]["sparkline"]
+        self.assertEqual(sparkline[0]["date"], (date.today() - timedelta(days=7)).isoformat())
+        self.assertEqual(len(sparkline), 8)
+        self.assertEqual(rows[1]["sparkline"], [])
+
+    def test_warm_watchlist_needs_no_queries_beyond_auth(self, publish_tick):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+    def test_market_tick_refreshes_favorited_rows_only(self, publish_tick):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_coins([market(0, price=42), market(2, price=7)])
+        rows = self.client.get(self.url).json()
+        self.assertEqual(rows[1]["last_price"], "42.0000000000")
+        self.assertIsNone(cache.get(f"coinrow:{self.coins['coin-2'].pk}"))
+
+    def test_requires_authentication(self, publish_tick):
+        self.client.credentials()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
@@ -0,0 +1,33 @@
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+from .ratelimit import TokenBucket
+
+
+class TokenBucketIPThrottle(BaseThrottle):
+    """
+    Per-client-IP token bucket kept in Redis, so the limit holds across all
+    gunicorn workers. Subclasses set the bucket scope, rate and burst.
+    The client IP comes from DRF's get_ident, so REST_FRAMEWORK["NUM_PROXIES"]
+    must match the deployment for X-Forwarded-For to be trusted.
+    """
+    scope = None
+    rate_per_minute = 60
+    burst = 10
+
+    def allow_request(self, request, view):
+        bucket = TokenBucket(
+            f"{self.scope}:{self.get_ident(request)}",
+            rate_per_minute=self.rate_per_minute,
+            burst=self.burst,
+        )
+        self._wait = bucket.try_acquire()
+        return self._wait == 0
+
+    def wait(self):
+        return self._wait
+
+
+class QAThrottle(TokenBucketIPThrottle):
+    scope = "qa"
+    rate_per_minute = settings.QA_RATE_PER_MINUTE
+    burst = settings.QA_BURST
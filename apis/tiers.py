@@ -0,0 +1,100 @@
+"""
+Hot/warm/cold refresh tiers for tracked coins.
+
+A coin's tier decides how often its market data (and history) is refreshed,
+so the fixed CoinGecko quota goes to the coins people actually look at:
+
+- hot: top HOT_RANK by market cap, anyone's favorite, or at least HOT_VIEWS
+  reads over the last VIEW_WINDOW_HOURS
+- warm: top WARM_RANK, or read at least WARM_VIEWS times
+- cold: everything else
+"""
+import logging
+import time
+import redis
+from django.db.models import Count
+from .models import Coin
+from .ratelimit import get_redis
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("hot", "warm", "cold")
+HOT_RANK = 50
+WARM_RANK = 250
+HOT_VIEWS = 20
+WARM_VIEWS = 1
+VIEW_WINDOW_HOURS = 24
+# Seconds between scheduled market refreshes per tier; keep in step with
+# CELERY_BEAT_SCHEDULE (cold coins ride on the hourly fetch_top_coins)
+REFRESH_INTERVALS = {"hot": 60, "warm": 15 * 60, "cold": 60 * 60}
+
+
+def _views_key(hour):
+    return f"coinviews:{hour}"
+
+
+def record_view(coingecko_id):
+    """
+    Count a read of one coin in the current hourly bucket. Best effort: a
+    Redis error is logged and never fails the request.
+    """
+    hour = int(time.time() // 3600)
+    key = _views_key(hour)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.zincrby(key, 1, coingecko_id)
+        pipe.expire(key, (VIEW_WINDOW_HOURS + 1) * 3600)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.debug(f"Could not record view of {coingecko_id}: {e}")
+
+
+def recent_views(hours=VIEW_WINDOW_HOURS):
+    """Reads per coingecko_id over the last `hours` hourly buckets."""
+    now = int(time.time() // 3600)
+    pipe = get_redis().pipeline(transaction=False)
+    for hour in range(now - hours + 1, now + 1):
+        pipe.zrange(_views_key(hour), 0, -1, withscores=True)
+    views = {}
+    for bucket in pipe.execute():
+        for member, score in bucket:
+            coingecko_id = member.decode()
+            views[coingecko_id] = views.get(coingecko_id, 0) + int(score)
+    return views
+
+
+def tier_for(rank, favorites, views):
+    if favorites or (rank is not None and rank <= HOT_RANK) or views >= HOT_VIEWS:
+        return "hot"
+    if (rank is not None and rank <= WARM_RANK) or views >= WARM_VIEWS:
+        return "warm"
+    return "cold"
+
+
+def refresh_interval(rank):
+    """
+    Seconds between scheduled market refreshes for a coin at `rank`. Judged
+    from rank alone so reads need no favorites or view lookups: those can only
+    put a coin in a hotter tier, so this never undershoots its interval.
+    """
+    return REFRESH_INTERVALS[tier_for(rank, 0, 0)]
+
+
+def assign_tiers():
+    """
+    Current tier membership from one grouped query and the view counters.
+
+    Returns:
+        dict of tier -> list of coingecko_ids, best rank first
+    """
+    views = recent_views()
+    coins = (
+        Coin.objects
+        .annotate(favorites=Count("favoritecoin"))
+        .order_by("market_cap_rank", "id")
+        .values_list("coingecko_id", "market_cap_rank", "favorites")
+    )
+    tiers = {tier: [] for tier in TIERS}
+    for coingecko_id, rank, favorites in coins:
+        tiers[tier_for(rank, favorites, views.get(coingecko_id, 0))].append(coingecko_id)
+    return tiers
@@ -1,15 +1,27 @@
 from django.urls import path
-from .views import TopCoinsView, CoinHistoryView, QAView
-from .users import FavoriteCoinListCreateView, FavoriteCoinDeleteView, UserRegisterView
+from .views import TopCoinsView, CoinHistoryView, QAView, MarketAnalyticsView, HistoryExportView
+from .async_views import AsyncTopCoinsView, AsyncCoinHistoryView, AsyncQAView
+from .streams import price_stream
+from .users import FavoriteCoinListCreateView, FavoriteCoinDeleteView, UserRegisterView, WatchlistView
 
 
 urlpatterns = [
 
     path("coins/top/", TopCoinsView.as_view(), name="top-coins"),
     path("coins/<str:coingecko_id>/history/", CoinHistoryView.as_view(), name="coin-history"),
+    path("history/export/", HistoryExportView.as_view(), name="history-export"),
     path("qa/", QAView.as_view(), name="qa"),
+    path("async/coins/top/", AsyncTopCoinsView.as_view(), name="async-top-coins"),
+    path("async/coins/<str:coingecko_id>/history/", AsyncCoinHistoryView.as_view(), name="async-coin-history"),
+    path("async/qa/", AsyncQAView.as_view(), name="async-qa"),
+    path("stream/prices/", price_stream, name="price-stream"),
+    path("analytics/returns/", MarketAnalyticsView.as_view(metric="returns"), name="analytics-returns"),
+    path("analytics/volatility/", MarketAnalyticsView.as_view(metric="volatility"), name="analytics-volatility"),
+    path("analytics/moving-averages/", MarketAnalyticsView.as_view(metric="moving_averages"), name="analytics-moving-averages"),
+    path("analytics/correlation/", MarketAnalyticsView.as_view(metric="correlation"), name="analytics-correlation"),
     path("register/", UserRegisterView.as_view(), name="user-register"),
     path("favorites/", FavoriteCoinListCreateView.as_view(), name="favorite-coin-list-create"),
     path("favorites/<int:coin_id>/", FavoriteCoinDeleteView.as_view(), name="favorite-coin-delete"),
+    path("watchlist/", WatchlistView.as_view(), name="watchlist"),
 
 ]
@@ -1,8 +1,10 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.exceptions import ValidationError
 from .models import FavoriteCoin
 from .serializers import FavoriteCoinSerializer, UserRegisterSerializer
+from .cache import favorites_list, refresh_coin_rows, refresh_favorites, watchlist
 from django.contrib.auth.models import User
 
 
@@ -18,7 +20,7 @@ class UserRegisterView(generics.CreateAPIView):
 
 class FavoriteCoinListCreateView(generics.ListCreateAPIView):
     """
-    GET  -> List user's favorite coins
+    GET  -> List user's favorite coins (from the cached favorites and coin rows)
     POST -> Add a coin to favorites
     """
     serializer_class = FavoriteCoinSerializer
@@ -27,10 +29,15 @@ class FavoriteCoinListCreateView(generics.ListCreateAPIView):
     def get_queryset(self):
         return FavoriteCoin.objects.filter(user=self.request.user).select_related("coin")
 
+    def list(self, request, *args, **kwargs):
+        return Response(favorites_list(request.user.id))
+
     def perform_create(self, serializer):
         if FavoriteCoin.objects.filter(user=self.request.user, coin=serializer.validated_data["coin"]).exists():
             raise ValidationError("Coin is already in your favorites.")
-        serializer.save(user=self.request.user)
+        favorite = serializer.save(user=self.request.user)
+        refresh_favorites(self.request.user.id)
+        refresh_coin_rows(coin_ids=[favorite.coin_id])
 
 
 class FavoriteCoinDeleteView(generics.DestroyAPIView):
@@ -43,3 +50,19 @@ class FavoriteCoinDeleteView(generics.DestroyAPIView):
     def get_object(self):
         coin_id = self.kwargs.get('coin_id')
         return FavoriteCoin.objects.get(user=self.request.user, coin_id=coin_id)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        refresh_favorites(self.request.user.id)
+
+
+class WatchlistView(APIView):
+    """
+    GET -> The user's favorite coins with market data, `favorited_at` and a
+    7-day `sparkline` of daily prices. Served from the cached favorites,
+    per-coin rows (rewritten on each market tick) and sparklines.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response(watchlist(request.user.id))
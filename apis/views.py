@@ -1,83 +1,320 @@
-from django.http import HttpResponse
-from rest_framework import generics, status
+import csv
+import json
+import time
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from django.contrib.auth import get_user_model
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
 from datetime import date, timedelta
-from django.db.models import Exists, OuterRef
 
 
 
-from .models import Coin, HistoricalPrice,FavoriteCoin
-from .serializers import CoinSerializer, CoinWithHistorySerializer, HistoricalPriceSerializer
+from .models import Coin, HistoricalPrice
 from .qa import handle_query
+from .cache import HISTORY_WINDOWS, cached_history, cached_qa_response, top_coins_for_user
+from .throttling import QAThrottle
+from .aggregation import MAX_HISTORY_DAYS, MAX_POINTS, RESOLUTIONS, history_series, max_candles
+from .analytics import ANALYTICS_WINDOWS, get_market_analytics
+from .pagination import next_link, parse_listing_params
+from .encoders import coin_encoder
+from .tiers import record_view
+from .tasks import ANALYTICS_RETRY_AFTER, queue_market_analytics, revalidate_stale
 
 # Create your views here.
 
-class TopCoinsView(generics.ListAPIView):
+class TopCoinsView(APIView):
     """
-    GET /api/coins/top/?n=10
-    Returns the top N coins ordered by market_cap_rank
+    GET /api/coins/top/?n=10&cursor=<next>&fields=id,name,last_price
+    Returns a page of at most n (<= MAX_PAGE_SIZE) coins ordered by
+    market_cap_rank, keyset-paginated on (market_cap_rank, id). The next page
+    is linked from the `Link: <...>; rel="next"` header. `fields` selects a
+    subset of the coin fields.
+    The first page is served from cache and invalidated on each market
+    refresh; later pages are keyset reads. `is_favorite` is overlaid from the
+    user's cached favorite set.
+    `X-Data-Age` gives the seconds since the oldest coin on the page was fetched.
     """
-    serializer_class = CoinSerializer
     permission_classes = [ IsAuthenticated]
 
-    def get_queryset(self):
-        user = self.request.user
-        n = self.request.query_params.get("n", 10)
+    def get(self, request):
+        n, after, fields = parse_listing_params(request.query_params)
+        rows, next_after, updated = top_coins_for_user(n, request.user.id, after=after, fields=fields)
+
+        response = Response(rows)
+        link = next_link(request.build_absolute_uri(), next_after)
+        if link:
+            response["Link"] = link
+        return stale_while_revalidate(response, updated)
+
+
+def with_data_age(response, updated):
+    """
+    Set X-Data-Age: whole seconds since the oldest of the served coins was
+    fetched. `updated` is a list of (coingecko_id, updated_at timestamp,
+    market_cap_rank).
+    """
+    if updated:
+        oldest = min(updated_at for _, updated_at, _ in updated)
+        response["X-Data-Age"] = str(max(0, int(time.time() - oldest)))
+    return response
+
+
+def stale_while_revalidate(response, updated):
+    """
+    Serve market data as it is, saying how old it is, and queue a background
+    refresh of the coins their tier's schedule has fallen behind on (see
+    tasks.revalidate_stale). Never waits on CoinGecko.
+    """
+    revalidate_stale(updated)
+    return with_data_age(response, updated)
+
+
+def parse_history_params(params):
+    """
+    Validate CoinHistoryView query params.
+
+    Returns:
+        (days, resolution, max_points); resolution and max_points may be None
+    """
+    days = params.get("days", 30)
+    try:
+        days = int(days)
+    except ValueError:
+        days = 30
+    days = max(1, min(days, MAX_HISTORY_DAYS))
+
+    resolution = params.get("resolution")
+    if resolution is not None and resolution not in RESOLUTIONS:
+        raise ValidationError({"resolution": f"Must be one of: {', '.join(RESOLUTIONS)}."})
+
+    max_points = params.get("max_points")
+    if max_points is not None:
         try:
-            n = int(n)
+            max_points = max(3, min(int(max_points), MAX_POINTS))
         except ValueError:
-            n = 10
-
-        return (
-            Coin.objects
-            .order_by("market_cap_rank")
-            .annotate(
-                is_favorite=Exists(
-                    FavoriteCoin.objects.filter(user=user, coin=OuterRef("pk"))
-                )
-            )[:n]
-        )
+            raise ValidationError({"max_points": "Must be an integer."})
+
+    # Candles are never silently dropped: the window must fit in max_points
+    limit = max_points or MAX_POINTS
+    if resolution is not None and max_candles(days, resolution) > limit:
+        raise ValidationError({
+            "days": f"{days} days at resolution={resolution} is more than {limit} candles; "
+                    f"use a coarser resolution or a shorter window.",
+        })
+    return days, resolution, max_points
+
+
+def conditional_json_response(request, body, etag, last_modified):
+    """Pre-rendered JSON with ETag/Last-Modified, or a 304 when the client is current."""
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp())
+    )
+    if response is None:
+        response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified.timestamp())
+    patch_cache_control(response, no_cache=True)
+    return response
+
 
 class CoinHistoryView(APIView):
     """
-    GET /api/coins/<coingecko_id>/history/?days=30
-    Returns the historical prices for the given coin for the last X days
+    GET /api/coins/<coingecko_id>/history/?days=30&resolution=week&max_points=200
+    Returns the historical prices for the given coin for the last X days.
+    `resolution` (day/week/month) returns OHLC candles; otherwise the series is
+    LTTB-downsampled to `max_points` (capped at MAX_POINTS).
+    `X-Data-Age` gives the seconds since the coin's market data was fetched.
     """
     permission_classes = [ IsAuthenticated]
 
     def get(self, request, coingecko_id):
-        coin = get_object_or_404(Coin, coingecko_id=coingecko_id)
+        days, resolution, max_points = parse_history_params(request.query_params)
+        if days in HISTORY_WINDOWS and resolution is None and max_points is None:
+            return self.cached_response(request, coingecko_id, days)
 
-        days = request.query_params.get("days", 30)
-        try:
-            days = int(days)
-        except ValueError:
-            days = 30
+        encode = coin_encoder()
+        coin = get_object_or_404(Coin.objects.values(*encode.columns), coingecko_id=coingecko_id)
+        record_view(coingecko_id)
 
         start_date = date.today() - timedelta(days=days)
-        history_qs = coin.history.filter(date__gte=start_date).order_by("date")
+        data = {"coin": encode(coin)}
+        if resolution:
+            data["resolution"] = resolution
+        data["history"] = history_series(
+            coin["id"], start_date, resolution=resolution, max_points=max_points or MAX_POINTS
+        )
+        updated = (coingecko_id, coin["updated_at"].timestamp(), coin["market_cap_rank"])
+        return stale_while_revalidate(Response(data), [updated])
 
-        serializer = HistoricalPriceSerializer(history_qs, many=True)
-        return Response({
-            "coin": CoinSerializer(coin).data,
-            "history": serializer.data
-        })
+    def cached_response(self, request, coingecko_id, days):
+        """
+        Standard windows are served from pre-rendered JSON, with an ETag and
+        Last-Modified so clients can revalidate and get a 304.
+        """
+        cached = cached_history(coingecko_id, days)
+        if cached is None:
+            raise Http404
+        record_view(coingecko_id)
+        body, etag, last_modified, updated = cached
+        return stale_while_revalidate(conditional_json_response(request, body, etag, last_modified), [updated])
 
 
 class QAView(APIView):
     """
     POST /api/qa/
-    Accepts a natural language query and returns structured response
+    Accepts a natural language query and returns structured response.
+    Throttled per client IP; answers are cached per normalized query.
     """
     permission_classes = [ AllowAny]
+    throttle_classes = [QAThrottle]
     def post(self, request):
         query = request.data.get("query")
         if not query:
             return Response({"error": "Missing 'query' in request body"}, status=status.HTTP_400_BAD_REQUEST)
 
-        result = handle_query(query)
+        result = cached_qa_response(query, handle_query)
+        if result.get("coin"):
+            record_view(result["coin"])
         return Response(result)
+
+
+class MarketAnalyticsView(APIView):
+    """
+    GET /api/analytics/<metric>/?days=30
+    Returns a precomputed market metric across all tracked coins (the
+    correlation matrix covers the top CORRELATION_COINS) for one of the
+    ANALYTICS_WINDOWS. Results are computed by the compute_market_analytics
+    task after each history refresh, never per request; before its first run
+    this queues it and returns 503 with Retry-After.
+    """
+    permission_classes = [ IsAuthenticated]
+    metric = None
+
+    def get(self, request):
+        days = request.query_params.get("days", 30)
+        try:
+            days = int(days)
+        except ValueError:
+            days = 30
+        if days not in ANALYTICS_WINDOWS:
+            raise ValidationError({"days": f"Must be one of: {', '.join(map(str, ANALYTICS_WINDOWS))}."})
+
+        result = get_market_analytics(days)
+        if result is None:
+            queue_market_analytics()
+            return Response(
+                {"detail": "Analytics are being computed, try again shortly."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(ANALYTICS_RETRY_AFTER)},
+            )
+        return Response({
+            "days": result["days"],
+            "as_of": result["as_of"],
+            self.metric: result[self.metric],
+        })
+
+
+class _Echo:
+    """File-like object whose write() just returns the line for csv.writer."""
+    def write(self, value):
+        return value
+
+
+class HistoryExportView(APIView):
+    """
+    GET /api/history/export/?coins=bitcoin,ethereum&start=2024-01-01&end=2024-12-31&fmt=ndjson
+    Streams HistoricalPrice rows for the given coins (all coins if omitted) and
+    date range as NDJSON (default) or CSV. Rows are read through a server-side
+    cursor and written as they arrive, so memory does not grow with the export.
+    Under ASGI the body is an async iterator over `aiterator()`: Django would
+    buffer a sync generator in full before sending it.
+    """
+    permission_classes = [ IsAuthenticated]
+    chunk_size = 2000
+    formats = {
+        "ndjson": "application/x-ndjson",
+        "csv": "text/csv",
+    }
+
+    def _parse_date(self, name):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise ValidationError({name: "Must be a date in YYYY-MM-DD format."})
+
+    def get(self, request):
+        fmt = request.query_params.get("fmt", "ndjson")
+        if fmt not in self.formats:
+            raise ValidationError({"fmt": f"Must be one of: {', '.join(self.formats)}."})
+
+        rows = HistoricalPrice.objects.all()
+        coins = request.query_params.get("coins")
+        if coins:
+            rows = rows.filter(coin__coingecko_id__in=[c.strip() for c in coins.split(",") if c.strip()])
+        start, end = self._parse_date("start"), self._parse_date("end")
+        if start:
+            rows = rows.filter(date__gte=start)
+        if end:
+            rows = rows.filter(date__lte=end)
+        # values(), not values_list(): the latter runs its query eagerly, so
+        # aiterator() would hit the database from the event loop
+        rows = rows.order_by("coin_id", "date").values("coin__coingecko_id", "date", "price")
+
+        header, encode = self._encoder(fmt)
+        if isinstance(request._request, ASGIRequest):
+            content = self._abatched(rows.aiterator(chunk_size=self.chunk_size), header, encode)
+        else:
+            content = self._batched(rows.iterator(chunk_size=self.chunk_size), header, encode)
+        response = StreamingHttpResponse(content, content_type=self.formats[fmt])
+        if fmt == "csv":
+            response["Content-Disposition"] = 'attachment; filename="history.csv"'
+        return response
+
+    @staticmethod
+    def _encoder(fmt):
+        """(header line or None, function(row) -> line) for the format."""
+        if fmt == "csv":
+            writer = csv.writer(_Echo())
+            return writer.writerow(["coin", "date", "price"]), (
+                lambda row: writer.writerow([row["coin__coingecko_id"], row["date"].isoformat(), format(row["price"], "f")])
+            )
+        return None, (
+            lambda row: json.dumps(
+                {"coin": row["coin__coingecko_id"], "date": row["date"].isoformat(), "price": format(row["price"], "f")}
+            ) + "\n"
+        )
+
+    def _batched(self, rows, header, encode):
+        # Send the first line straight away, then group writes per chunk.
+        batch = [header] if header else []
+        flushed = False
+        for row in rows:
+            batch.append(encode(row))
+            if not flushed or len(batch) >= self.chunk_size:
+                yield "".join(batch)
+                batch = []
+                flushed = True
+        if batch:
+            yield "".join(batch)
+
+    async def _abatched(self, rows, header, encode):
+        # _batched over an async iterator
+        batch = [header] if header else []
+        flushed = False
+        async for row in rows:
+            batch.append(encode(row))
+            if not flushed or len(batch) >= self.chunk_size:
+                yield "".join(batch)
+                batch = []
+                flushed = True
+        if batch:
+            yield "".join(batch)
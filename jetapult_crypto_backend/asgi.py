@@ -2,6 +2,12 @@
 ASGI config for jetapult_crypto_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+This is the production entry point:
+
+    uvicorn jetapult_crypto_backend.asgi:application --workers 4
+
+Long-lived endpoints such as the SSE price stream (apis.streams) refuse to
+run under WSGI.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
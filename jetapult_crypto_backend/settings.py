@@ -97,6 +97,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "apis.metrics.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware", 
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -132,6 +133,14 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'apis.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    # Reverse proxies in front of the app. Throttles key on the client IP the
+    # last proxy appended to X-Forwarded-For; with 0 the header is ignored and
+    # REMOTE_ADDR is used, so clients can't pick their own throttle bucket.
+    'NUM_PROXIES': int(os.getenv("NUM_PROXIES", 0)),
 }
 
 SIMPLE_JWT = {
@@ -145,31 +154,119 @@ SIMPLE_JWT = {
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# PostgreSQL is used when POSTGRES_DB is set; SQLite stays the default for
+# local development and tests.
+if os.getenv("POSTGRES_DB"):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv("POSTGRES_DB"),
+            'USER': os.getenv("POSTGRES_USER", "postgres"),
+            'PASSWORD': os.getenv("POSTGRES_PASSWORD", ""),
+            'HOST': os.getenv("POSTGRES_HOST", "127.0.0.1"),
+            'PORT': os.getenv("POSTGRES_PORT", "5432"),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.getenv("POSTGRES_POOL", "1") == "1":
+        # psycopg connection pool per process; requires CONN_MAX_AGE = 0
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.getenv("POSTGRES_POOL_MIN", 2)),
+                'max_size': int(os.getenv("POSTGRES_POOL_MAX", 10)),
+                'timeout': 10,
+            },
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv("POSTGRES_CONN_MAX_AGE", 60))
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # WAL lets readers run alongside the Celery writer, and
+                # IMMEDIATE transactions wait for the lock instead of failing.
+                'init_command': 'PRAGMA journal_mode=WAL;',
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+        }
+    }
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("CACHE_URL", "redis://127.0.0.1:6379/1"),
+        "KEY_PREFIX": "jetapult",
     }
 }
 
-CELERY_BROKER_URL = "redis://127.0.0.1:6379/0"
-CELERY_RESULT_BACKEND = "redis://127.0.0.1:6379/0"
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
 CELERY_TASK_ALWAYS_EAGER = False  # set True only in tests
 
 
+# Coins tracked by the hourly market sweep (250 per CoinGecko page). The
+# sweep discovers new entrants and refreshes the cold tier; hot and warm
+# tiers (apis/tiers.py) are refreshed more often on their own schedules.
+TOP_COINS_TRACKED = int(os.getenv("TOP_COINS_TRACKED", 1000))
+
 CELERY_BEAT_SCHEDULE = {
-    "fetch-top-coins-every-5min": {
+    "refresh-hot-coins-every-minute": {
+        "task": "apis.tasks.refresh_tier",
+        "schedule": crontab(),  # every minute
+        "args": ("hot",),
+    },
+    "refresh-warm-coins-every-15min": {
+        "task": "apis.tasks.refresh_tier",
+        "schedule": crontab(minute="*/15"),
+        "args": ("warm",),
+    },
+    "fetch-top-coins-hourly": {
         "task": "apis.tasks.fetch_top_coins",
-        "schedule": crontab(minute="*/5"),  # every 5 minutes
-        "args": (10,),
+        "schedule": crontab(minute=5),  # hourly, off the warm tier's minutes
+        "args": (TOP_COINS_TRACKED,),
     },
-    "fetch-all-coins-history-daily": {
-        "task": "apis.tasks.fetch_all_coins_history",
+    "fetch-hot-warm-history-daily": {
+        "task": "apis.tasks.fetch_tier_history",
         "schedule": crontab(minute=0, hour=0),  # daily at 00:00 UTC
-        "args": (30, 20), 
+        "args": (["hot", "warm"], 30),
+    },
+    "fetch-cold-history-weekly": {
+        "task": "apis.tasks.fetch_tier_history",
+        "schedule": crontab(minute=30, hour=0, day_of_week=0),  # Sundays 00:30 UTC
+        "args": (["cold"], 30),
+    },
+    "ensure-history-partitions-monthly": {
+        "task": "apis.tasks.ensure_history_partitions",
+        "schedule": crontab(minute=0, hour=1, day_of_month=1),  # no-op on SQLite
     },
 }
 
+# Shared CoinGecko quota across all Celery workers (demo plan: 30 calls/min)
+COINGECKO_CALLS_PER_MINUTE = int(os.getenv("COINGECKO_CALLS_PER_MINUTE", 30))
+COINGECKO_BURST = int(os.getenv("COINGECKO_BURST", 5))
+
+# Coins served more than this many seconds past their tier's refresh interval
+# (apis.tiers.REFRESH_INTERVALS) are queued for a background refresh; reads
+# are still served at once
+MARKET_STALE_GRACE = int(os.getenv("MARKET_STALE_GRACE", 180))
+
+# Columnar .npy copy of HistoricalPrice for analytics reads; must be a path
+# shared by the Celery workers that write it and the web workers that read it.
+HISTORY_STORE_DIR = os.getenv("HISTORY_STORE_DIR", str(BASE_DIR / "var" / "history"))
+
+# Per-IP limit for the anonymous QA endpoint
+QA_RATE_PER_MINUTE = int(os.getenv("QA_RATE_PER_MINUTE", 30))
+QA_BURST = int(os.getenv("QA_BURST", 10))
+
+# Bearer token for the Prometheus /metrics endpoint; unset disables it (404)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
 
 LOGGING = {
     'version': 1,